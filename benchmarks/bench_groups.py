@@ -0,0 +1,71 @@
+"""Show that group expansion costs the same however many projects share a group.
+
+For each project count, a fake cloud is created in which one group has a
+role in every project. The benchmark times the resolution of recipients
+for every project (NotifierApp.users_by_project) and counts the group
+membership requests made; users and role assignments are fetched first
+and are not included in the time.
+
+    python -m benchmarks.bench_groups [--latency SECONDS]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from pathlib import Path
+
+from esi_lease_notifier.app import NotifierApp
+from esi_lease_notifier.idp import OpenstackIdp
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+from tests.fakecloud import FakeCloud
+from tests.fakes import FakeMailer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--users-per-group", type=int, default=50)
+    parser.add_argument(
+        "--projects", type=int, nargs="+", default=[10, 100, 1000, 5000]
+    )
+    args = parser.parse_args()
+
+    config = LeaseNotifierConfiguration(
+        email=EmailConfiguration(smtp_from="bench@example.com")
+    )
+
+    print(f"{'projects':>8}  {'resolve':>9}  {'group requests':>14}")
+    for projects in args.projects:
+        with tempfile.TemporaryDirectory() as tempdir, FakeCloud.generate(
+            projects=projects,
+            users_per_project=1,
+            leases_per_project=0,
+            groups=1,
+            users_per_group=args.users_per_group,
+            latency=args.latency,
+        ) as cloud:
+            os.environ["OS_CLIENT_CONFIG_FILE"] = str(
+                cloud.write_clouds_yaml(Path(tempdir) / "clouds.yaml")
+            )
+            idp = OpenstackIdp(cloud="fake")
+            app = NotifierApp(config, idp=idp, mailer=FakeMailer())
+            app.users_by_id
+            idp.get_role_assignments()
+
+            start = time.perf_counter()
+            app.users_by_project
+            elapsed = time.perf_counter() - start
+
+            group_requests = sum(
+                count
+                for request, count in cloud.requests.items()
+                if request.startswith("GET /v3/groups/")
+            )
+            print(f"{projects:8d}  {elapsed * 1000:7.1f}ms  {group_requests:14d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Time OpenstackIdp against a local fake Keystone/ESI API.
+
+Every request to the fake API is delayed by --latency seconds. Each
+configuration fetches users, projects, role assignments and leases with a
+fresh OpenstackIdp and reports the wall-clock time and number of requests.
+
+    python -m benchmarks.bench_idp [--projects N] [--latency SECONDS]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Any
+
+from esi_lease_notifier.idp import OpenstackIdp
+from tests.fakecloud import FakeCloud
+
+CONFIGURATIONS: list[tuple[str, dict[str, Any]]] = [
+    ("default", {}),
+    ("parallel", {"parallel": True, "pool_size": 4}),
+    ("leases/100", {"page_sizes": {"leases": 100}}),
+    ("parallel leases/100", {"parallel": True, "page_sizes": {"leases": 100}}),
+]
+
+
+def fetch(idp: OpenstackIdp) -> None:
+    idp.prefetch()
+    idp.get_users()
+    idp.get_projects()
+    idp.get_role_assignments()
+    idp.get_lease_store()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", "-p", type=int, default=50)
+    parser.add_argument("--leases-per-project", "-l", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir, FakeCloud.generate(
+        projects=args.projects,
+        leases_per_project=args.leases_per_project,
+        latency=args.latency,
+    ) as cloud:
+        os.environ["OS_CLIENT_CONFIG_FILE"] = str(
+            cloud.write_clouds_yaml(Path(tempdir) / "clouds.yaml")
+        )
+
+        for name, options in CONFIGURATIONS:
+            idp = OpenstackIdp(cloud="fake", **options)
+            # clear the per-method caches left by the previous configuration
+            for method in [
+                OpenstackIdp.get_users,
+                OpenstackIdp.get_projects,
+                OpenstackIdp.get_role_assignments,
+                OpenstackIdp.get_lease_store,
+            ]:
+                method.cache_clear()
+            cloud.requests.clear()
+
+            start = time.perf_counter()
+            fetch(idp)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>20}: {elapsed:6.2f}s, "
+                f"{sum(cloud.requests.values()):4d} requests"
+            )
+
+
+if __name__ == "__main__":
+    main()
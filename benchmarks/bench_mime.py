@@ -0,0 +1,86 @@
+"""Compare the CPU cost of building and sending messages.
+
+The "mime" path is the original one: Message.as_mime_multipart() followed
+by smtplib's send_message(), which flattens the message again. The
+"prepared" path serializes each message once with MessageBuilder and hands
+the bytes to sendmail(). In both cases the SMTP conversation itself is
+replaced by a stub, so only message handling is measured.
+
+    python -m benchmarks.bench_mime [-n COUNT]
+"""
+
+import argparse
+import smtplib
+import time
+
+from email.message import Message as EmailMessage
+
+from esi_lease_notifier.mime import MessageBuilder
+from esi_lease_notifier.models import Message
+from esi_lease_notifier.templates import filter_tabulate
+
+
+class NullSMTP(smtplib.SMTP):
+    """An SMTP client that discards messages instead of sending them."""
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_sent = 0
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):  # pyright: ignore[reportIncompatibleMethodOverride]
+        self.bytes_sent += len(msg)
+        return {}
+
+
+def make_message(i: int, leases: int) -> Message:
+    table = [
+        (f"node-{j}", "2025-01-01T00:00", "2025-02-01T00:00") for j in range(leases)
+    ]
+    return Message(
+        msg_from="esi@example.com",
+        recipients=[f"user{i}@example.com", f"admin{i}@example.com"],
+        subject=f"Your leases in project{i}",
+        body_text=filter_tabulate(table),  # pyright: ignore[reportArgumentType]
+        body_html=filter_tabulate(table, html=True),  # pyright: ignore[reportArgumentType]
+    )
+
+
+def bench_mime(messages: list[Message]) -> tuple[float, int]:
+    smtp = NullSMTP()
+    start = time.process_time()
+    for message in messages:
+        msg: EmailMessage = message.as_mime_multipart()
+        smtp.send_message(msg)
+    return time.process_time() - start, smtp.bytes_sent
+
+
+def bench_prepared(messages: list[Message]) -> tuple[float, int]:
+    smtp = NullSMTP()
+    builder = MessageBuilder("esi@example.com")
+    start = time.process_time()
+    for message in messages:
+        prepared = builder.build(message)
+        smtp.sendmail(prepared.msg_from, prepared.recipients, prepared.data)
+    return time.process_time() - start, smtp.bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", "-n", type=int, default=2000)
+    parser.add_argument("--leases", "-l", type=int, default=5)
+    args = parser.parse_args()
+
+    messages = [make_message(i, args.leases) for i in range(args.count)]
+    for name, bench in [("mime", bench_mime), ("prepared", bench_prepared)]:
+        elapsed, sent = bench(messages)
+        print(
+            f"{name:>8}: {elapsed / args.count * 1e6:8.1f} us/message, "
+            f"{sent / args.count:8.0f} bytes/message"
+        )
+
+
+if __name__ == "__main__":
+    main()
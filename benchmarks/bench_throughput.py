@@ -0,0 +1,176 @@
+"""Measure end-to-end sending throughput against a local SMTP/LMTP sink.
+
+NotifierApp and SmtpMailer process a synthetic set of projects and send
+one message per project to a tests.smtpsink.SmtpSink, once over TCP (SMTP)
+and once over a unix socket (LMTP). For each mode the benchmark reports
+messages per second, the median and 99th percentile time to deliver one
+message, and the number of connections the sink accepted.
+
+    python -m benchmarks.bench_throughput [--projects N] [--latency SECONDS]
+        [--error-rate RATE]
+
+With --error-rate, the sink answers that fraction of messages with a 451,
+and the mailer is given a (high) rate limit so that it retries them.
+"""
+
+import argparse
+import datetime
+import statistics
+import tempfile
+import time
+
+from email.mime.multipart import MIMEMultipart
+from pathlib import Path
+
+from esi_lease_notifier.app import NotifierApp
+from esi_lease_notifier.mailer import SmtpMailer
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import IdReference
+from esi_lease_notifier.models import Lease
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+from esi_lease_notifier.models import PreparedMessage
+from esi_lease_notifier.models import Project
+from esi_lease_notifier.models import RateLimitConfiguration
+from esi_lease_notifier.models import RoleAssignment
+from esi_lease_notifier.models import Scope
+from esi_lease_notifier.models import User
+from tests.smtpsink import SmtpSink
+
+
+class SyntheticIdp:
+    def __init__(self, projects: int, users_per_project: int, leases_per_project: int):
+        now = datetime.datetime.now()
+        self.projects = [
+            Project(id=f"p{p}", name=f"project{p}") for p in range(projects)
+        ]
+        self.users = [
+            User(id=f"u{p}-{u}", name=f"user{p}-{u}", email=f"user{p}-{u}@example.com")
+            for p in range(projects)
+            for u in range(users_per_project)
+        ]
+        self.role_assignments = [
+            RoleAssignment(
+                role=IdReference(id="member"),
+                scope=Scope(project=IdReference(id=f"p{p}")),
+                user=IdReference(id=f"u{p}-{u}"),
+            )
+            for p in range(projects)
+            for u in range(users_per_project)
+        ]
+        self.leases = [
+            Lease(
+                id=f"l{p}-{n}",
+                resource_name=f"node{p}-{n}",
+                project_id=f"p{p}",
+                start_time=now,
+                end_time=now + datetime.timedelta(days=n + 1),
+            )
+            for p in range(projects)
+            for n in range(leases_per_project)
+        ]
+
+    def get_users(self) -> list[User]:
+        return self.users
+
+    def get_projects(self) -> list[Project]:
+        return self.projects
+
+    def get_role_assignments(self) -> list[RoleAssignment]:
+        return self.role_assignments
+
+    def get_leases(self) -> list[Lease]:
+        return self.leases
+
+
+class TimedSmtpMailer(SmtpMailer):
+    """An SmtpMailer that records how long each delivery attempt takes."""
+
+    latencies: list[float]
+
+    def deliver(
+        self,
+        msg: MIMEMultipart | PreparedMessage,
+        recipients: list[str] | None = None,
+    ) -> dict[str, tuple[int, bytes]]:
+        start = time.perf_counter()
+        try:
+            return super().deliver(msg, recipients)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def write_templates(path: Path) -> Path:
+    path.mkdir()
+    (path / "subject.txt").write_text("Leases in {{ project.name }}")
+    (path / "body.txt").write_text("{{ leases|tabulate }}")
+    (path / "body.html").write_text("{{ leases|tabulate(html=True) }}")
+    return path
+
+
+def run(
+    mode: str,
+    idp: SyntheticIdp,
+    templates: Path,
+    tempdir: Path,
+    args: argparse.Namespace,
+) -> None:
+    address = tempdir / f"{mode}.sock" if mode == "unix" else ("127.0.0.1", 0)
+    with SmtpSink(
+        address, latency=args.latency, error_rate=args.error_rate, seed=0
+    ) as sink:
+        email = EmailConfiguration(
+            smtp_from="bench@example.com",
+            smtp_server=str(address) if mode == "unix" else "127.0.0.1",
+            smtp_port=0 if mode == "unix" else sink.port,
+            rate_limit=(
+                RateLimitConfiguration(messages_per_minute=1000000, burst=1000)
+                if args.error_rate
+                else None
+            ),
+        )
+        mailer = TimedSmtpMailer(
+            smtp_from=email.smtp_from,
+            smtp_server=email.smtp_server,
+            smtp_port=email.smtp_port,
+            rate_limit=email.rate_limit,
+        )
+        mailer.latencies = []
+        app = NotifierApp(
+            LeaseNotifierConfiguration(email=email),
+            template_path=templates,
+            idp=idp,
+            mailer=mailer,
+        )
+
+        start = time.perf_counter()
+        app.process_leases()
+        elapsed = time.perf_counter() - start
+
+    sent = len(sink.messages)
+    percentiles = statistics.quantiles(mailer.latencies, n=100)
+    p50, p99 = percentiles[49], percentiles[98]
+    print(
+        f"{mode:>4}: {sent / elapsed:8.1f} msgs/sec, "
+        f"p50 {p50 * 1000:6.2f}ms, p99 {p99 * 1000:6.2f}ms, "
+        f"{sink.connections} connections, {len(mailer.latencies) - sent} retries"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", "-p", type=int, default=500)
+    parser.add_argument("--users-per-project", type=int, default=3)
+    parser.add_argument("--leases-per-project", "-l", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    idp = SyntheticIdp(args.projects, args.users_per_project, args.leases_per_project)
+    with tempfile.TemporaryDirectory() as tempdir:
+        templates = write_templates(Path(tempdir) / "templates")
+        for mode in ["tcp", "unix"]:
+            run(mode, idp, templates, Path(tempdir), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,42 @@
+import jinja2
 import logging
 
+from collections.abc import Iterable
+from collections.abc import Sequence
 from functools import cache, cached_property
 from itertools import groupby
 from pathlib import Path
+from typing import Any
 
+from .enrichment import NodeEnricher
 from .idp import IdpProtocol
 from .idp import OpenstackIdp
+from .idp import LeaseStoreProvider
+from .idp import RefreshableIdp
+from .idp import IdentityRefreshableIdp
+from .idp import PrefetchingIdp
+from .idp import GroupResolvingIdp
+from .idp import NodeProvider
+from .leasestore import LeaseStore
+from .leasestore import LeaseView
 from .mailer import MailerProtocol
 from .mailer import SmtpMailer
+from .mailer import PreparedMailerProtocol
+from .mime import MessageBuilder
+from .multicloud import MultiCloudIdp
 from .models import LeaseNotifierConfiguration
 from .models import Project
+from .models import LeaseLike
 from .models import User
-from .models import Lease
+from .models import RoleAssignment
 from .models import Message
+from .models import ReportEntry
+from .models import SkipReason
+from .profiling import NullProfiler
+from .profiling import ProfilerProtocol
+from .report import ReportProtocol
 from .templates import create_template_environment
+from .tokencache import TokenCache
 
 LOG = logging.getLogger(__name__)
 
@@ -25,13 +48,36 @@ class NotifierApp:
         template_path: str | Path | None = None,
         idp: IdpProtocol | None = None,
         mailer: MailerProtocol | None = None,
+        report: ReportProtocol | None = None,
+        profiler: ProfilerProtocol | None = None,
     ):
         if idp:
             self.idp = idp
         elif config.openstack:
-            self.idp = OpenstackIdp(cloud=config.openstack.cloud)
+            options: dict[str, Any] = {
+                "shard": config.shard,
+                "page_sizes": dict(config.openstack.page_sizes),
+                "pool_size": config.openstack.pool_size,
+                "parallel": config.openstack.prefetch,
+                "token_cache": (
+                    TokenCache(
+                        config.openstack.token_cache,
+                        margin=config.openstack.token_cache_margin,
+                    )
+                    if config.openstack.token_cache
+                    else None
+                ),
+            }
+            if config.openstack.clouds:
+                self.idp = MultiCloudIdp.from_clouds(
+                    config.openstack.clouds,
+                    timeout=config.openstack.cloud_timeout,
+                    **options,
+                )
+            else:
+                self.idp = OpenstackIdp(cloud=config.openstack.cloud, **options)
         else:
-            self.idp = OpenstackIdp()
+            self.idp = OpenstackIdp(shard=config.shard)
 
         self.mailer = (
             mailer
@@ -43,15 +89,33 @@ class NotifierApp:
                 smtp_tls=config.email.smtp_tls,
                 smtp_username=config.email.smtp_username,
                 smtp_password=config.email.smtp_password,
+                rate_limit=config.email.rate_limit,
             )
         )
         self.config = config
+        self.report = report
+        self.profiler = profiler if profiler else NullProfiler()
+        self.builder = MessageBuilder(config.email.smtp_from)
+        self.enricher: NodeEnricher | None = None
+        if config.enrichment and config.enrichment.node_fields:
+            if isinstance(self.idp, NodeProvider):
+                self.enricher = NodeEnricher(
+                    self.idp,
+                    config.enrichment.node_fields,
+                    ttl=config.enrichment.ttl,
+                )
+            else:
+                LOG.warning("idp cannot list nodes; leases will not be enriched")
         self.env = create_template_environment(
             template_path
             if template_path
             else (config.template_path if config.template_path else "templates")
         )
 
+    @property
+    def multi_cloud(self) -> bool:
+        return isinstance(self.idp, MultiCloudIdp)
+
     @cached_property
     def projects_by_name(self) -> dict[str, Project]:
         return {project.name: project for project in self.idp.get_projects()}
@@ -68,43 +132,134 @@ class NotifierApp:
     def users_by_id(self) -> dict[str, User]:
         return {user.id: user for user in self.idp.get_users()}
 
-    def get_filtered_leases(self) -> list[Lease]:
-        return [
-            lease
-            for lease in self.idp.get_leases()
-            if (not self.config.filters)
-            or any(filter.selects(lease) for filter in self.config.filters)
-        ]
+    def in_shard(self, project_id: str) -> bool:
+        return self.config.shard is None or self.config.shard.selects_project(
+            project_id
+        )
 
     @cached_property
-    def leases_by_project(self) -> dict[str, list[Lease]]:
-        return {
-            group[0]: list(group[1])
-            for group in groupby(
-                sorted(self.get_filtered_leases(), key=lambda lease: lease.project_id),
-                key=lambda lease: lease.project_id,
-            )
-        }
+    def lease_store(self) -> LeaseStore:
+        if isinstance(self.idp, LeaseStoreProvider):
+            return self.idp.get_lease_store()
+
+        return LeaseStore.from_leases(self.idp.get_leases())
+
+    def get_filtered_leases(self) -> LeaseStore:
+        store = self.lease_store
+
+        if self.config.shard:
+            store = store.take(store.select_projects(self.in_shard))
+
+        if self.config.filters:
+            selected: set[int] = set()
+            for filter in self.config.filters:
+                selected.update(filter.select(store))
+            store = store.take(sorted(selected))
+
+        return store
+
+    @cached_property
+    def leases_by_project(self) -> dict[str, list[LeaseView]]:
+        return self.get_filtered_leases().group_by_project()
+
+    def refresh_leases(self) -> LeaseStore:
+        """Discard cached leases, fetch them again, and return the filtered leases."""
+        if isinstance(self.idp, RefreshableIdp):
+            self.idp.refresh_leases()
+
+        for attr in ["lease_store", "leases_by_project"]:
+            self.__dict__.pop(attr, None)
+
+        with self.profiler.phase("fetch_leases"):
+            self.lease_store
+
+        return self.get_filtered_leases()
+
+    def refresh_identity(self) -> None:
+        """Discard cached users, projects and role assignments and fetch them again."""
+        if isinstance(self.idp, IdentityRefreshableIdp):
+            self.idp.refresh_identity()
+
+        for attr in [
+            "projects_by_name",
+            "projects_by_id",
+            "users_by_name",
+            "users_by_id",
+            "users_by_project",
+            "leases_by_project",
+        ]:
+            self.__dict__.pop(attr, None)
+        # functools.cache on a method caches for every instance
+        self.get_group_users.cache_clear()
+        self.get_project_emails.cache_clear()
+        self.resolve_project.cache_clear()
+
+        with self.profiler.phase("fetch_projects"):
+            self.idp.get_projects()
+        with self.profiler.phase("fetch_users"):
+            self.idp.get_users()
+        with self.profiler.phase("fetch_role_assignments"):
+            self.idp.get_role_assignments()
+        with self.profiler.phase("group"):
+            self.resolve_filters()
+            self.users_by_project
 
     @cached_property
     def users_by_project(self) -> dict[str, set[User]]:
         return {
             project: set(
-                self.users_by_id[assignment.user.id] for assignment in assignments
+                user
+                for assignment in assignments
+                for user in self.get_assignment_users(assignment)
             )
             for project, assignments in groupby(
                 sorted(
-                    [ra for ra in self.idp.get_role_assignments() if ra.scope.project],
+                    [
+                        ra
+                        for ra in self.idp.get_role_assignments()
+                        if ra.scope.project and self.in_shard(ra.scope.project.id)
+                    ],
                     key=lambda ra: ra.scope.project.id,  # pyright: ignore[reportOptionalMemberAccess]
                 ),
                 key=lambda ra: ra.scope.project.id,  # pyright: ignore[reportOptionalMemberAccess]
             )
         }
 
+    def get_assignment_users(self, assignment: RoleAssignment) -> Iterable[User]:
+        if assignment.user:
+            return (self.users_by_id[assignment.user.id],)
+        if assignment.group:
+            return self.get_group_users(assignment.group.id)
+        return ()
+
+    @cache
+    def get_group_users(self, group_id: str) -> frozenset[User]:
+        """Return the members of a group.
+
+        Membership is looked up once per group and shared by every project
+        the group has a role in.
+        """
+        if not isinstance(self.idp, GroupResolvingIdp):
+            LOG.warning("cannot resolve members of group %s", group_id)
+            return frozenset()
+
+        return frozenset(
+            self.users_by_id[user_id]
+            for user_id in self.idp.get_group_members(group_id)
+            if user_id in self.users_by_id
+        )
+
     @cache
     def get_project_emails(self, name_or_id: str) -> list[str]:
         project = self.resolve_project(name_or_id)
-        return [user.email for user in self.users_by_project[project.id] if user.email]
+        # users from different clouds may share an email address
+        return list(
+            dict.fromkeys(
+                user.email
+                for user in self.users_by_project.get(project.id, set())
+                if user.email
+            )
+        )
 
     @cache
     def resolve_project(self, id_or_name: str) -> Project:
@@ -117,47 +272,106 @@ class NotifierApp:
 
         return project
 
-    def process_leases(self):
-        subject_template = self.env.get_template("subject.txt")
-        body_template_html = self.env.get_template("body.html")
-        body_template_text = self.env.get_template("body.txt")
+    def fetch(self):
+        """Fetch everything from the idp and group leases and users by project."""
+        if isinstance(self.idp, PrefetchingIdp):
+            with self.profiler.phase("prefetch"):
+                self.idp.prefetch()
+        with self.profiler.phase("fetch_projects"):
+            self.idp.get_projects()
+        with self.profiler.phase("fetch_users"):
+            self.idp.get_users()
+        with self.profiler.phase("fetch_role_assignments"):
+            self.idp.get_role_assignments()
+        with self.profiler.phase("fetch_leases"):
+            self.lease_store
+        if self.enricher:
+            with self.profiler.phase("fetch_nodes"):
+                self.enricher.refresh()
+        with self.profiler.phase("group"):
+            self.resolve_filters()
+            self.leases_by_project
+            self.users_by_project
 
-        self.resolve_filters()
+    @cached_property
+    def templates(self) -> tuple[jinja2.Template, jinja2.Template, jinja2.Template]:
+        return (
+            self.env.get_template("subject.txt"),
+            self.env.get_template("body.html"),
+            self.env.get_template("body.txt"),
+        )
+
+    def process_leases(self):
+        self.templates
+        self.fetch()
 
         for project_id, leases in self.leases_by_project.items():
-            project = self.projects_by_id[project_id]
-            recipients = self.get_project_emails(project.id)
+            self.notify_project(self.projects_by_id[project_id], leases)
 
-            if not leases:
-                LOG.info("no leases for project %s", project.name)
-                continue
+        if self.report:
+            self.report_filtered_projects()
 
-            if not recipients:
-                LOG.warning(
-                    "%d leases for project %s but no recipients",
-                    len(leases),
-                    project.name,
-                )
-                continue
+    def notify_project(
+        self, project: Project, leases: Sequence[LeaseLike], **context: Any
+    ) -> bool:
+        """Send a message about leases to the members of project.
 
-            leasetable = [
-                (
-                    lease.resource_name,
-                    lease.start_time.isoformat(timespec="minutes"),
-                    lease.end_time.isoformat(timespec="minutes"),
-                )
-                for lease in leases
-            ]
-            LOG.info(
-                "message to %s for project %s with %d leases",
-                ",".join(recipients),
-                project.name,
+        Any extra keyword arguments are passed to the templates. Returns
+        True if a message was sent.
+        """
+        subject_template, body_template_html, body_template_text = self.templates
+        recipients = self.get_project_emails(project.id)
+
+        if not leases:
+            LOG.info("no leases for project %s", project.name)
+            return False
+
+        if not recipients:
+            LOG.warning(
+                "%d leases for project %s but no recipients",
                 len(leases),
+                project.name,
             )
+            self.add_report_entry(
+                project_id=project.id,
+                project_name=project.name,
+                lease_count=len(leases),
+                skipped=SkipReason.NO_RECIPIENTS,
+            )
+            return False
 
-            subject = subject_template.render(project=project, leases=leasetable)
-            body_html = body_template_html.render(project=project, leases=leasetable)
-            body_text = body_template_text.render(project=project, leases=leasetable)
+        leasetable = [
+            (
+                lease.resource_name,
+                lease.start_time.isoformat(timespec="minutes"),
+                lease.end_time.isoformat(timespec="minutes"),
+            )
+            + ((lease.cloud or "",) if self.multi_cloud else ())
+            + (self.enricher.columns(lease) if self.enricher else ())
+            for lease in leases
+        ]
+        context.setdefault(
+            "extra_headings",
+            (["CLOUD"] if self.multi_cloud else [])
+            + (self.enricher.headings if self.enricher else []),
+        )
+        LOG.info(
+            "message to %s for project %s with %d leases",
+            ",".join(recipients),
+            project.name,
+            len(leases),
+        )
+
+        with self.profiler.phase("render"):
+            subject = subject_template.render(
+                project=project, leases=leasetable, **context
+            )
+            body_html = body_template_html.render(
+                project=project, leases=leasetable, **context
+            )
+            body_text = body_template_text.render(
+                project=project, leases=leasetable, **context
+            )
 
             message = Message(
                 msg_from=self.config.email.smtp_from,
@@ -166,7 +380,47 @@ class NotifierApp:
                 body_html=body_html,
                 body_text=body_text,
             )
-            self.mailer.send_message(message.as_mime_multipart())
+            prepared = (
+                self.builder.build(message)
+                if isinstance(self.mailer, PreparedMailerProtocol)
+                else None
+            )
+
+        with self.profiler.phase("send"):
+            if prepared is not None:
+                self.mailer.send_prepared(prepared)  # pyright: ignore[reportAttributeAccessIssue]
+            else:
+                self.mailer.send_message(message.as_mime_multipart())
+
+        self.add_report_entry(
+            project_id=project.id,
+            project_name=project.name,
+            recipients=recipients,
+            lease_count=len(leases),
+            subject_size=len(subject.encode()),
+            body_text_size=len(body_text.encode()),
+            body_html_size=len(body_html.encode()),
+        )
+
+        return True
+
+    def add_report_entry(self, **kwargs: Any):
+        if self.report:
+            self.report.add(ReportEntry(**kwargs))
+
+    def report_filtered_projects(self):
+        """Add report entries for projects whose leases were all filtered out."""
+        for project_id, count in self.lease_store.count_by_project().items():
+            if project_id in self.leases_by_project or not self.in_shard(project_id):
+                continue
+
+            project = self.projects_by_id.get(project_id)
+            self.add_report_entry(
+                project_id=project_id,
+                project_name=project.name if project else "",
+                lease_count=count,
+                skipped=SkipReason.FILTERED,
+            )
 
     def resolve_filters(self):
         """Transform project name references in filters into project ids."""
@@ -9,11 +9,23 @@ from email.mime.multipart import MIMEMultipart
 
 from esi_lease_notifier.idp import IdpProtocol
 from esi_lease_notifier.mailer import MailerProtocol
+from esi_lease_notifier.mailer import EmlMailer
+from esi_lease_notifier.mailer import SmtpMailer
+from esi_lease_notifier.report import ReportProtocol
+from esi_lease_notifier.report import open_report
+from esi_lease_notifier.report import read_report
+from esi_lease_notifier.profiling import Profiler
+from esi_lease_notifier.scheduler import ExpiryScheduler
+from esi_lease_notifier.scheduler import parse_duration
 
 from .models import ConfigurationFile
 from .models import ProjectFilter
 from .models import ExpiresFilter
+from .models import ShardSpec
+from .models import ReportSummary
+from .models import PreparedMessage
 from .app import NotifierApp
+from .snapshot import write_snapshot
 
 LOG = logging.getLogger(__name__)
 LOGLEVELS = ["WARNING", "INFO", "DEBUG"]
@@ -25,6 +37,9 @@ class NullMailer:
     def send_message(self, msg: MIMEMultipart):  # pyright: ignore[reportUnusedParameter]
         pass
 
+    def send_prepared(self, msg: PreparedMessage):  # pyright: ignore[reportUnusedParameter]
+        pass
+
 
 def load_class(qname: str):
     modulename, classname = qname.rsplit(".", 1)
@@ -40,12 +55,32 @@ def load_class(qname: str):
 @click.option("--verbosity", "-v", count=True)
 @click.option("--filter", "-f", "filters", multiple=True)
 @click.option("--dryrun", "-n", is_flag=True, default=False, type=bool)
+@click.option("--save-snapshot", type=click.Path(dir_okay=False))
+@click.option("--report", "report_path", type=click.Path(dir_okay=False))
+@click.option("--eml-dir", type=click.Path(file_okay=False))
+@click.option("--shard", envvar="ESI_LEASE_NOTIFIER_SHARD")
+@click.option("--profile", "profile_dir", type=click.Path(file_okay=False))
+@click.option("--profile-sample-interval", type=float)
+@click.option("--schedule", is_flag=True, default=False, type=bool)
+@click.option("--threshold", "thresholds", multiple=True, default=["24h"])
+@click.option("--refresh-interval", default="1h")
+@click.option("--identity-refresh-interval", default="24h")
 def main(
     template_path: str,
     config_file: io.IOBase,
     filters: list[str],
     verbosity: int = 0,
     dryrun: bool = False,
+    save_snapshot: str | None = None,
+    report_path: str | None = None,
+    eml_dir: str | None = None,
+    shard: str | None = None,
+    profile_dir: str | None = None,
+    profile_sample_interval: float | None = None,
+    schedule: bool = False,
+    thresholds: tuple[str, ...] = ("24h",),
+    refresh_interval: str = "1h",
+    identity_refresh_interval: str = "24h",
 ):
     logLevel = LOGLEVELS[min(verbosity, len(LOGLEVELS))]
     logging.basicConfig(level=logLevel)
@@ -54,24 +89,57 @@ def main(
             yaml.safe_load(config_file)
         ).esi_lease_notifier
 
+    if shard:
+        try:
+            config.shard = ShardSpec.parse(shard)
+        except ValueError as err:
+            raise click.BadParameter(str(err), param_hint="--shard")
+
+    if config.shard:
+        LOG.info("processing shard %s", config.shard)
+
     mailer: MailerProtocol | None = None
     idp: IdpProtocol | None = None
+    report: ReportProtocol | None = None
+
+    if eml_dir and not dryrun:
+        raise click.BadParameter("requires --dryrun", param_hint="--eml-dir")
+    if eml_dir and config.mailer:
+        raise click.BadParameter(
+            "cannot be used with a configured mailer", param_hint="--eml-dir"
+        )
 
     if config.mailer:
         mailer = load_class(config.mailer)()
+    elif eml_dir:
+        mailer = EmlMailer(eml_dir)
     elif dryrun:
         mailer = NullMailer()
 
     if config.idp:
         idp = load_class(config.idp)()
 
+    if report_path:
+        report = open_report(report_path)
+
+    profiler = (
+        Profiler(profile_dir, sample_interval=profile_sample_interval)
+        if profile_dir
+        else None
+    )
+
     app = NotifierApp(
         config,
         template_path=template_path,
         mailer=mailer,
         idp=idp,
+        report=report,
+        profiler=profiler,
     )
 
+    if save_snapshot:
+        write_snapshot(app.idp, save_snapshot)
+
     for filterspec in filters:
         kind, paramspec = filterspec.split("=")
         params = dict(param.split(":") for param in paramspec.split(","))
@@ -85,4 +153,64 @@ def main(
 
         config.filters.append(filter)
 
-    app.process_leases()
+    try:
+        if schedule:
+            try:
+                scheduler = ExpiryScheduler(
+                    app,
+                    thresholds=[parse_duration(spec) for spec in thresholds],
+                    refresh_interval=parse_duration(refresh_interval),
+                    identity_refresh_interval=parse_duration(identity_refresh_interval),
+                )
+            except ValueError as err:
+                raise click.BadParameter(str(err))
+            scheduler.run()
+        else:
+            app.process_leases()
+    finally:
+        if report:
+            report.close()
+        if profiler:
+            profiler.close()
+
+    if isinstance(app.mailer, SmtpMailer) and app.mailer.shaper:
+        LOG.info(
+            "throttled for %.1f seconds, %d deferrals",
+            app.mailer.shaper.throttled,
+            app.mailer.shaper.deferrals,
+        )
+
+
+@click.command()
+@click.option("--output", "-o", type=click.Path(dir_okay=False))
+@click.option("--verbosity", "-v", count=True)
+@click.argument(
+    "reports", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False)
+)
+def merge(reports: list[str], output: str | None = None, verbosity: int = 0):
+    """Merge the reports written by several shards and summarize them."""
+    logLevel = LOGLEVELS[min(verbosity, len(LOGLEVELS))]
+    logging.basicConfig(level=logLevel)
+
+    summary = ReportSummary()
+    seen: set[str] = set()
+    merged = open_report(output) if output else None
+
+    try:
+        for path in reports:
+            for entry in read_report(path):
+                if entry.project_id in seen:
+                    LOG.warning(
+                        "project %s appears in more than one report", entry.project_id
+                    )
+                seen.add(entry.project_id)
+                summary.add(entry)
+                if merged:
+                    merged.add(entry)
+    finally:
+        if merged:
+            merged.close()
+
+    click.echo(
+        yaml.safe_dump(summary.model_dump(mode="json"), sort_keys=False), nl=False
+    )
@@ -0,0 +1,73 @@
+import datetime
+import logging
+import time
+
+from collections.abc import Callable
+from typing import Any
+
+from .idp import NodeProvider
+from .models import LeaseLike
+
+LOG = logging.getLogger(__name__)
+
+
+def lookup(data: dict[str, Any], path: str) -> Any:
+    """Look up a dotted path, such as `properties.cpu_arch`, in nested dicts."""
+    value: Any = data
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+
+    return value
+
+
+class NodeEnricher:
+    """Add node attributes to leases.
+
+    All nodes are fetched from the idp in a single listing and the
+    configured fields are extracted from each. The result is kept for `ttl`,
+    so a long-running process (such as the expiry scheduler) does not list
+    the nodes again every time leases are refreshed. Looking up the fields
+    for a lease is a dictionary lookup on its resource uuid; leases whose
+    node is unknown get empty values.
+    """
+
+    def __init__(
+        self,
+        idp: NodeProvider,
+        fields: list[str],
+        ttl: datetime.timedelta = datetime.timedelta(hours=1),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.idp = idp
+        self.fields = fields
+        self.ttl = ttl.total_seconds()
+        self.clock = clock
+        self.nodes: dict[str, tuple[str, ...]] = {}
+        self.fetched_at: float | None = None
+
+    @property
+    def headings(self) -> list[str]:
+        return [field.rsplit(".", 1)[-1].upper() for field in self.fields]
+
+    def refresh(self) -> None:
+        """Fetch the nodes again if the cached nodes are older than ttl."""
+        now = self.clock()
+        if self.fetched_at is not None and now - self.fetched_at < self.ttl:
+            return
+
+        nodes = self.idp.get_nodes(sorted({f.split(".", 1)[0] for f in self.fields}))
+        self.nodes = {
+            uuid: tuple(
+                "" if (value := lookup(node, field)) is None else str(value)
+                for field in self.fields
+            )
+            for uuid, node in nodes.items()
+        }
+        self.fetched_at = now
+        LOG.info("cached attributes of %d nodes", len(self.nodes))
+
+    def columns(self, lease: LeaseLike) -> tuple[str, ...]:
+        self.refresh()
+        return self.nodes.get(lease.resource_uuid or "", ("",) * len(self.fields))
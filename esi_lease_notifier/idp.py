@@ -1,14 +1,21 @@
-from typing import Protocol
+from typing import Any, Protocol, runtime_checkable
 
 import esi
 import logging
 
+from collections.abc import Iterator
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache
+from keystoneauth1.session import TCPKeepAliveAdapter
 
 from .models import User
 from .models import Project
 from .models import Lease
 from .models import RoleAssignment
+from .models import ShardSpec
+from .leasestore import LeaseStore
+from .tokencache import TokenCache
 
 LOG = logging.getLogger(__name__)
 
@@ -20,20 +27,158 @@ class IdpProtocol(Protocol):
     def get_role_assignments(self) -> list[RoleAssignment]: ...
 
 
+@runtime_checkable
+class LeaseStoreProvider(Protocol):
+    """An idp that can load leases directly into a LeaseStore."""
+
+    def get_lease_store(self) -> LeaseStore: ...
+
+
+@runtime_checkable
+class RefreshableIdp(Protocol):
+    """An idp that caches leases and can be asked to fetch them again."""
+
+    def refresh_leases(self) -> None: ...
+
+
+@runtime_checkable
+class IdentityRefreshableIdp(Protocol):
+    """An idp that caches users, projects and role assignments and can be
+    asked to fetch them again."""
+
+    def refresh_identity(self) -> None: ...
+
+
+@runtime_checkable
+class GroupResolvingIdp(Protocol):
+    """An idp that can list the ids of the users in a group."""
+
+    def get_group_members(self, group_id: str) -> list[str]: ...
+
+
+@runtime_checkable
+class NodeProvider(Protocol):
+    """An idp that can list the nodes that leases refer to.
+
+    get_nodes returns a dictionary of nodes, keyed by node uuid, with at
+    least the given (top-level) fields.
+    """
+
+    def get_nodes(self, fields: list[str]) -> dict[str, dict[str, Any]]: ...
+
+
+@runtime_checkable
+class PrefetchingIdp(Protocol):
+    """An idp that can fetch everything up front."""
+
+    def prefetch(self) -> None: ...
+
+
 class OpenstackIdp:
-    def __init__(self, cloud: str | None = None):
+    """Fetch users, projects, role assignments and leases from OpenStack.
+
+    If a shard is given, leases and role assignments for projects outside
+    the shard (and users without a role in the shard) are discarded before
+    they are validated.
+
+    page_sizes maps a listing ("users", "projects", "role_assignments",
+    "leases" or "nodes") to the number of items to request per page. Only
+    set a page size for services that support limit/marker pagination;
+    Keystone, for example, ignores both. pool_size sets the number of
+    keep-alive connections kept per host. If parallel is set, prefetch()
+    fetches all four listings concurrently, then the members of every group
+    that has a role assignment. If token_cache is given, Keystone tokens are
+    loaded from and saved to it.
+    """
+
+    def __init__(
+        self,
+        cloud: str | None = None,
+        shard: ShardSpec | None = None,
+        page_sizes: dict[str, int] | None = None,
+        pool_size: int | None = None,
+        parallel: bool = False,
+        token_cache: TokenCache | None = None,
+    ):
         self.conn = esi.connect(cloud=cloud)
+        self.shard = shard
+        self.page_sizes = page_sizes or {}
+        self.parallel = parallel
+
+        if pool_size:
+            adapter = TCPKeepAliveAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size
+            )
+            for scheme in ["http://", "https://"]:
+                self.conn.session.session.mount(scheme, adapter)
+
+        if token_cache:
+            token_cache.attach(self.conn.session.auth)
+
+    def query(self, listing: str) -> dict[str, Any]:
+        page_size = self.page_sizes.get(listing)
+        return {"limit": page_size} if page_size else {}
+
+    def prefetch(self) -> None:
+        """Fetch every listing concurrently, if parallel fetching is enabled."""
+        if not self.parallel:
+            return
+
+        # authenticate once, before the listings need a token
+        self.conn.authorize()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            role_assignments = executor.submit(self.get_role_assignments)
+            futures: list[Future[Any]] = [
+                role_assignments,
+                executor.submit(self.get_projects),
+                executor.submit(self.get_lease_store),
+                # in a shard, get_users needs the role assignments
+                executor.submit(
+                    lambda: (
+                        role_assignments.result() if self.shard else None,
+                        self.get_users(),
+                    )
+                ),
+            ]
+            for future in futures:
+                future.result()
+
+            groups = {ra.group.id for ra in self.get_role_assignments() if ra.group}
+            list(executor.map(self.get_group_members, groups))
+
+    def in_shard(self, project_id: str | None) -> bool:
+        return self.shard is None or (
+            project_id is not None and self.shard.selects_project(project_id)
+        )
 
     @cache
     def get_users(self) -> list[User]:
         LOG.info("getting users")
-        return [User.model_validate(user) for user in self.conn.identity.users()]
+        if self.shard is None:
+            return [
+                User.model_validate(user)
+                for user in self.conn.identity.users(**self.query("users"))
+            ]
+
+        user_ids: set[str] = set()
+        for ra in self.get_role_assignments():
+            if ra.user:
+                user_ids.add(ra.user.id)
+            elif ra.group:
+                user_ids.update(self.get_group_members(ra.group.id))
+
+        return [
+            User.model_validate(user)
+            for user in self.conn.identity.users(**self.query("users"))
+            if user.id in user_ids
+        ]
 
     @cache
     def get_projects(self) -> list[Project]:
         LOG.info("getting projects")
         return [
-            Project.model_validate(project) for project in self.conn.identity.projects()
+            Project.model_validate(project)
+            for project in self.conn.identity.projects(**self.query("projects"))
         ]
 
     @cache
@@ -41,10 +186,52 @@ class OpenstackIdp:
         LOG.info("getting role assignments")
         return [
             RoleAssignment.model_validate(ra)
-            for ra in self.conn.identity.role_assignments()
+            for ra in self.conn.identity.role_assignments(
+                **self.query("role_assignments")
+            )
+            if self.in_shard((ra.scope or {}).get("project", {}).get("id"))
         ]
 
+    @cache
+    def get_group_members(self, group_id: str) -> list[str]:
+        LOG.debug("getting members of group %s", group_id)
+        return [user.id for user in self.conn.identity.group_users(group_id)]
+
+    def get_nodes(self, fields: list[str]) -> dict[str, dict[str, Any]]:
+        LOG.info("getting nodes")
+        return {
+            node.id: {field: getattr(node, field, None) for field in fields}
+            for node in self.conn.baremetal.nodes(
+                fields=sorted(set(fields) | {"uuid"}), **self.query("nodes")
+            )
+        }
+
+    def iter_leases(self) -> Iterator[Lease]:
+        return (
+            Lease.model_validate(lease)
+            for lease in self.conn.lease.leases(**self.query("leases"))
+            if self.in_shard(lease.project_id)
+        )
+
     @cache
     def get_leases(self) -> list[Lease]:
         LOG.info("getting leases")
-        return [Lease.model_validate(lease) for lease in self.conn.lease.leases()]
+        return list(self.iter_leases())
+
+    @cache
+    def get_lease_store(self) -> LeaseStore:
+        LOG.info("getting leases")
+        return LeaseStore.from_leases(self.iter_leases())
+
+    def refresh_leases(self) -> None:
+        # functools.cache on a method caches for every instance, so this
+        # also discards leases cached by other instances.
+        self.get_leases.cache_clear()
+        self.get_lease_store.cache_clear()
+
+    def refresh_identity(self) -> None:
+        # as in refresh_leases, this affects every instance.
+        self.get_users.cache_clear()
+        self.get_projects.cache_clear()
+        self.get_role_assignments.cache_clear()
+        self.get_group_members.cache_clear()
@@ -0,0 +1,277 @@
+import datetime
+
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+
+from .models import Lease
+from .models import LeaseStatus
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+NO_TIME = -(2**63)
+
+
+def to_micros(dt: datetime.datetime) -> int:
+    """Convert a datetime to microseconds since the epoch.
+
+    Aware datetimes are converted to UTC; naive datetimes are converted as if
+    they were UTC, so that naive values round-trip unchanged.
+    """
+    if dt.tzinfo is None:
+        return (dt - EPOCH) // datetime.timedelta(microseconds=1)
+
+    return (dt - EPOCH_UTC) // datetime.timedelta(microseconds=1)
+
+
+def from_micros(
+    micros: int, tzinfo: datetime.tzinfo | None
+) -> datetime.datetime | None:
+    if micros == NO_TIME:
+        return None
+
+    if tzinfo is None:
+        return EPOCH + datetime.timedelta(microseconds=micros)
+
+    return (EPOCH_UTC + datetime.timedelta(microseconds=micros)).astimezone(tzinfo)
+
+
+class Interner:
+    """Map values to small integer codes, and back."""
+
+    def __init__(self):
+        self.values: list = []
+        self.codes: dict = {}
+
+    def intern(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+
+        return code
+
+
+class LeaseView:
+    """A read-only view of a single lease in a LeaseStore.
+
+    Views have the same attributes as Lease, so they can be used wherever
+    the code only reads a lease.
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "LeaseStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def id(self) -> str:
+        return self.store.ids[self.index]
+
+    @property
+    def resource_name(self) -> str:
+        return self.store.strings.values[self.store.resource_names[self.index]]
+
+    @property
+    def resource_uuid(self) -> str | None:
+        return self.store.uuids.values[self.store.resource_uuids[self.index]]
+
+    @property
+    def project_id(self) -> str:
+        return self.store.strings.values[self.store.project_ids[self.index]]
+
+    @property
+    def start_time(self) -> datetime.datetime:
+        return self.store.get_time(self.store.start_times, self.index)  # pyright: ignore[reportReturnType]
+
+    @property
+    def end_time(self) -> datetime.datetime:
+        return self.store.get_time(self.store.end_times, self.index)  # pyright: ignore[reportReturnType]
+
+    @property
+    def expire_time(self) -> datetime.datetime | None:
+        return self.store.get_time(self.store.expire_times, self.index)
+
+    @property
+    def status(self) -> LeaseStatus:
+        return self.store.statuses.values[self.store.status_codes[self.index]]
+
+    @property
+    def cloud(self) -> str | None:
+        return self.store.clouds.values[self.store.cloud_codes[self.index]]
+
+    def as_lease(self) -> Lease:
+        return Lease(
+            id=self.id,
+            resource_name=self.resource_name,
+            resource_uuid=self.resource_uuid,
+            project_id=self.project_id,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            expire_time=self.expire_time,
+            status=self.status,
+            cloud=self.cloud,
+        )
+
+    def __repr__(self) -> str:
+        return f"<LeaseView {self.id} project={self.project_id}>"
+
+
+class LeaseStore:
+    """Columnar storage for a large number of leases.
+
+    Times are stored as int64 microseconds since the epoch; project ids,
+    resource names and uuids, time zones, statuses and clouds are interned
+    and stored as integer codes. Iterating over a store yields LeaseView
+    objects.
+    """
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.strings = Interner()
+        self.uuids = Interner()
+        self.tzinfos = Interner()
+        self.statuses = Interner()
+        self.clouds = Interner()
+        self.project_ids = array("I")
+        self.resource_names = array("I")
+        self.resource_uuids = array("I")
+        self.start_times = array("q")
+        self.end_times = array("q")
+        self.expire_times = array("q")
+        self.tz_codes = array("B")
+        self.status_codes = array("B")
+        self.cloud_codes = array("B")
+
+    @classmethod
+    def from_leases(cls, leases: Iterable[Lease]) -> "LeaseStore":
+        store = cls()
+        for lease in leases:
+            store.append(lease)
+
+        return store
+
+    def append(self, lease: Lease) -> None:
+        # all times in a lease are assumed to share the time zone of end_time
+        self.ids.append(lease.id)
+        self.project_ids.append(self.strings.intern(lease.project_id))
+        self.resource_names.append(self.strings.intern(lease.resource_name))
+        self.resource_uuids.append(self.uuids.intern(lease.resource_uuid))
+        self.start_times.append(to_micros(lease.start_time))
+        self.end_times.append(to_micros(lease.end_time))
+        self.expire_times.append(
+            to_micros(lease.expire_time) if lease.expire_time else NO_TIME
+        )
+        self.tz_codes.append(self.tzinfos.intern(lease.end_time.tzinfo))
+        self.status_codes.append(self.statuses.intern(lease.status))
+        self.cloud_codes.append(self.clouds.intern(lease.cloud))
+
+    def extend(self, other: "LeaseStore", cloud: str | None = None) -> None:
+        """Append every lease in other, tagging them with cloud if it is given.
+
+        Interned values are re-coded, so other's leases are copied column by
+        column without creating a Lease for each.
+        """
+        strings = [self.strings.intern(value) for value in other.strings.values]
+        uuids = [self.uuids.intern(value) for value in other.uuids.values]
+        tzinfos = [self.tzinfos.intern(value) for value in other.tzinfos.values]
+        statuses = [self.statuses.intern(value) for value in other.statuses.values]
+        clouds = [
+            self.clouds.intern(cloud if cloud is not None else value)
+            for value in other.clouds.values
+        ]
+
+        self.ids.extend(other.ids)
+        self.project_ids.extend(strings[code] for code in other.project_ids)
+        self.resource_names.extend(strings[code] for code in other.resource_names)
+        self.resource_uuids.extend(uuids[code] for code in other.resource_uuids)
+        self.start_times.extend(other.start_times)
+        self.end_times.extend(other.end_times)
+        self.expire_times.extend(other.expire_times)
+        self.tz_codes.extend(tzinfos[code] for code in other.tz_codes)
+        self.status_codes.extend(statuses[code] for code in other.status_codes)
+        self.cloud_codes.extend(clouds[code] for code in other.cloud_codes)
+
+    def get_time(self, column: array, index: int) -> datetime.datetime | None:
+        return from_micros(column[index], self.tzinfos.values[self.tz_codes[index]])
+
+    def take(self, indices: Iterable[int]) -> "LeaseStore":
+        """Return a new store containing the leases at the given indices.
+
+        The new store shares its interned values with this one.
+        """
+        store = LeaseStore()
+        store.strings = self.strings
+        store.uuids = self.uuids
+        store.tzinfos = self.tzinfos
+        store.statuses = self.statuses
+        store.clouds = self.clouds
+        for i in indices:
+            store.ids.append(self.ids[i])
+            store.project_ids.append(self.project_ids[i])
+            store.resource_names.append(self.resource_names[i])
+            store.resource_uuids.append(self.resource_uuids[i])
+            store.start_times.append(self.start_times[i])
+            store.end_times.append(self.end_times[i])
+            store.expire_times.append(self.expire_times[i])
+            store.tz_codes.append(self.tz_codes[i])
+            store.status_codes.append(self.status_codes[i])
+            store.cloud_codes.append(self.cloud_codes[i])
+
+        return store
+
+    def select_projects(self, predicate: Callable[[str], bool]) -> list[int]:
+        """Return the indices of leases whose project id satisfies predicate.
+
+        The predicate is called once per distinct project.
+        """
+        selected: dict[int, bool] = {}
+        result: list[int] = []
+        for i, code in enumerate(self.project_ids):
+            keep = selected.get(code)
+            if keep is None:
+                keep = selected[code] = predicate(self.strings.values[code])
+            if keep:
+                result.append(i)
+
+        return result
+
+    def ending_between(
+        self,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[int]:
+        """Return the indices of leases with start <= end_time <= end."""
+        lo = to_micros(start) if start else NO_TIME
+        hi = to_micros(end) if end else 2**63 - 1
+        return [i for i, t in enumerate(self.end_times) if lo <= t <= hi]
+
+    def group_by_project(self) -> dict[str, list[LeaseView]]:
+        """Group leases by project id, sorted by project id."""
+        groups: dict[int, list[LeaseView]] = {}
+        for i, code in enumerate(self.project_ids):
+            groups.setdefault(code, []).append(LeaseView(self, i))
+
+        return {
+            self.strings.values[code]: groups[code]
+            for code in sorted(groups, key=lambda code: self.strings.values[code])
+        }
+
+    def count_by_project(self) -> dict[str, int]:
+        counts: dict[int, int] = {}
+        for code in self.project_ids:
+            counts[code] = counts.get(code, 0) + 1
+
+        return {self.strings.values[code]: count for code, count in counts.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> LeaseView:
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+
+        return LeaseView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[LeaseView]:
+        return (LeaseView(self, i) for i in range(len(self)))
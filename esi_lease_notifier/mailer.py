@@ -1,10 +1,15 @@
 import smtplib
 import logging
+import time
 
-from typing import Protocol
+from collections.abc import Callable
+from pathlib import Path
+from typing import Protocol, runtime_checkable
 from email.mime.multipart import MIMEMultipart
 
 from .models import EmailTLSOption
+from .models import RateLimitConfiguration
+from .models import PreparedMessage
 
 LOG = logging.getLogger(__name__)
 
@@ -13,6 +18,83 @@ class MailerProtocol(Protocol):
     def send_message(self, msg: MIMEMultipart) -> None: ...
 
 
+@runtime_checkable
+class PreparedMailerProtocol(Protocol):
+    """A mailer that can send messages serialized by a MessageBuilder."""
+
+    def send_message(self, msg: MIMEMultipart) -> None: ...
+    def send_prepared(self, msg: PreparedMessage) -> None: ...
+
+
+class RateShaper:
+    """A token bucket that adapts its rate to transient SMTP failures.
+
+    The rate drops by a factor of `backoff` each time the relay defers a
+    message and recovers by `recovery` messages per minute for each message
+    the relay accepts.
+    """
+
+    def __init__(
+        self,
+        config: RateLimitConfiguration,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.config = config
+        self.clock = clock
+        self.sleep = sleep
+        self.rate = config.messages_per_minute / 60
+        self.tokens = float(config.burst)
+        self.last = clock()
+        self.throttled = 0.0
+        self.deferrals = 0
+
+    def refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(
+            float(self.config.burst), self.tokens + (now - self.last) * self.rate
+        )
+        self.last = now
+
+    def acquire(self) -> None:
+        """Wait until a message may be sent."""
+        self.refill()
+        if self.tokens < 1:
+            delay = (1 - self.tokens) / self.rate
+            LOG.debug("throttling for %.2f seconds", delay)
+            self.sleep(delay)
+            self.throttled += delay
+            self.refill()
+
+        self.tokens -= 1
+
+    def deferred(self) -> None:
+        self.deferrals += 1
+        self.rate = max(
+            self.config.min_messages_per_minute / 60, self.rate * self.config.backoff
+        )
+        self.tokens = min(self.tokens, 0)
+        LOG.warning(
+            "relay deferred message, reducing rate to %.1f messages/minute",
+            self.rate * 60,
+        )
+
+    def accepted(self) -> None:
+        self.rate = min(
+            self.config.messages_per_minute / 60,
+            self.rate + self.config.recovery / 60,
+        )
+
+
+def is_transient(err: smtplib.SMTPException) -> bool:
+    if isinstance(err, smtplib.SMTPResponseException):
+        return 400 <= err.smtp_code < 500
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in err.recipients.values())
+
+    return False
+
+
 class SmtpMailer:
     def __init__(
         self,
@@ -22,6 +104,7 @@ class SmtpMailer:
         smtp_tls: EmailTLSOption = EmailTLSOption.EMAIL_TLS_NONE,
         smtp_username: str | None = None,
         smtp_password: str | None = None,
+        rate_limit: RateLimitConfiguration | None = None,
     ):
         if smtp_server.startswith("/"):
             smtp_class = smtplib.LMTP
@@ -37,8 +120,69 @@ class SmtpMailer:
         self.smtp_class = smtp_class
         self.smtp_username = smtp_username
         self.smtp_password = smtp_password
+        self.rate_limit = rate_limit
+        self.shaper = RateShaper(rate_limit) if rate_limit else None
 
     def send_message(self, msg: MIMEMultipart) -> None:
+        self.send(msg)
+
+    def send_prepared(self, msg: PreparedMessage) -> None:
+        self.send(msg)
+
+    def send(self, msg: MIMEMultipart | PreparedMessage) -> None:
+        """Send msg, retrying transient failures if a rate limit is set.
+
+        Recipients that the relay refuses with a transient (4xx) reply are
+        retried on their own, as further deferrals.
+        """
+        if self.shaper is None:
+            refused = self.deliver(msg)
+            if refused:
+                LOG.error("relay refused mail to %s", ",".join(refused))
+            return
+
+        retries = 0
+        recipients: list[str] | None = None
+        while True:
+            self.shaper.acquire()
+            try:
+                refused = self.deliver(msg, recipients)
+            except smtplib.SMTPException as err:
+                if not is_transient(err) or retries >= self.shaper.config.max_retries:
+                    raise
+                retries += 1
+                self.shaper.deferred()
+                continue
+
+            recipients = [
+                recipient
+                for recipient, (code, _) in refused.items()
+                if 400 <= code < 500
+            ]
+            if len(recipients) < len(refused):
+                LOG.error(
+                    "relay refused mail to %s",
+                    ",".join(r for r in refused if r not in recipients),
+                )
+            if not recipients:
+                self.shaper.accepted()
+                break
+            if retries >= self.shaper.config.max_retries:
+                LOG.error("relay deferred mail to %s; giving up", ",".join(recipients))
+                break
+
+            retries += 1
+            self.shaper.deferred()
+
+    def deliver(
+        self,
+        msg: MIMEMultipart | PreparedMessage,
+        recipients: list[str] | None = None,
+    ) -> dict[str, tuple[int, bytes]]:
+        """Deliver msg to its recipients, or only to the given recipients.
+
+        Returns the recipients that the relay refused, as smtplib does.
+        """
         with self.smtp_class(self.smtp_server, self.smtp_port) as mailer:
             if self.smtp_tls == EmailTLSOption.EMAIL_TLS_STARTTLS:
                 mailer.starttls()
@@ -46,5 +190,33 @@ class SmtpMailer:
             if self.smtp_username is not None and self.smtp_password is not None:
                 mailer.login(self.smtp_username, self.smtp_password)
 
-            LOG.info("sending mail to %s", msg["to"])
-            mailer.send_message(msg)
+            if isinstance(msg, PreparedMessage):
+                recipients = recipients or msg.recipients
+                LOG.info("sending mail to %s", ",".join(recipients))
+                return mailer.sendmail(msg.msg_from, recipients, msg.data)
+
+            LOG.info(
+                "sending mail to %s", ",".join(recipients) if recipients else msg["to"]
+            )
+            return mailer.send_message(msg, to_addrs=recipients)
+
+
+class EmlMailer:
+    """Write messages to numbered .eml files in a directory instead of sending them."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+
+    def send_message(self, msg: MIMEMultipart) -> None:
+        self.count += 1
+        path = self.directory / f"{self.count:06d}.eml"
+        LOG.info("writing mail to %s to %s", msg["to"], path)
+        path.write_bytes(msg.as_bytes())
+
+    def send_prepared(self, msg: PreparedMessage) -> None:
+        self.count += 1
+        path = self.directory / f"{self.count:06d}.eml"
+        LOG.info("writing mail to %s to %s", ",".join(msg.recipients), path)
+        path.write_bytes(msg.data)
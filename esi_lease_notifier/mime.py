@@ -0,0 +1,117 @@
+import base64
+import email.policy
+import secrets
+import time
+
+from email.header import Header
+from email.utils import format_datetime
+from email.utils import localtime
+from email.utils import make_msgid
+from email.utils import parseaddr
+
+from .models import Message
+from .models import PreparedMessage
+
+CRLF = b"\r\n"
+MAX_LINE_LENGTH = 998
+
+
+class MessageBuilder:
+    """Serialize messages to bytes, once, ready to hand to sendmail().
+
+    This produces the same multipart/alternative structure as
+    Message.as_mime_multipart, but writes it directly instead of building a
+    tree of MIME objects and flattening it through the email generator.
+    Only headers that need encoding or folding go through the email
+    package: non-ASCII values are encoded as by Message.as_mime_multipart
+    (compat32's Header), and long ASCII values are folded by
+    email.policy.SMTP.
+
+    Values shared by every message (the Message-ID domain and the Date
+    header for the current second) are computed once and reused.
+    """
+
+    def __init__(self, msg_from: str, msgid_domain: str | None = None):
+        self.msg_from = msg_from
+        # make_msgid looks up the fully qualified host name on every call
+        # unless it is given a domain.
+        self.msgid_domain = (
+            msgid_domain or parseaddr(msg_from)[1].rpartition("@")[2] or None
+        )
+        self.policy = email.policy.SMTP
+        self._date: tuple[int, bytes] = (-1, b"")
+
+    def date(self) -> bytes:
+        now = int(time.time())
+        if self._date[0] != now:
+            self._date = (now, self.header("Date", format_datetime(localtime())))
+
+        return self._date[1]
+
+    def header(self, name: str, value: str) -> bytes:
+        if (
+            value.isascii()
+            and len(name) + len(value) + 2 <= self.policy.max_line_length  # pyright: ignore[reportOptionalOperand]
+            and "\n" not in value
+            and "\r" not in value
+        ):
+            return f"{name}: {value}".encode() + CRLF
+
+        if not value.isascii():
+            # email.policy.SMTP puts adjacent encoded words on separate
+            # lines, which loses the spaces between them when decoded
+            encoded = Header(value, "utf-8", header_name=name).encode(linesep="\r\n")
+            return f"{name}: {encoded}".encode("ascii") + CRLF
+
+        return (
+            self.policy.header_factory(name, value)
+            .fold(policy=self.policy)
+            .encode("ascii")
+        )
+
+    def part(self, subtype: str, text: str) -> bytes:
+        data = text.encode()
+        lines = data.splitlines()
+        if text.isascii() and all(len(line) <= MAX_LINE_LENGTH for line in lines):
+            charset, encoding = "us-ascii", "7bit"
+            payload = CRLF.join(lines) + CRLF
+        else:
+            charset, encoding = "utf-8", "base64"
+            payload = base64.encodebytes(data).replace(b"\n", CRLF)
+
+        return (
+            f'Content-Type: text/{subtype}; charset="{charset}"\r\n'
+            f"Content-Transfer-Encoding: {encoding}\r\n\r\n"
+        ).encode() + payload
+
+    def build(self, message: Message) -> PreparedMessage:
+        parts = [
+            self.part("plain", message.body_text),
+            self.part("html", message.body_html),
+        ]
+        boundary = f"==============={secrets.token_hex(16)}=="
+        while any(boundary.encode() in part for part in parts):
+            boundary = f"==============={secrets.token_hex(16)}=="
+        delimiter = b"--" + boundary.encode()
+
+        data = b"".join(
+            [
+                self.header("From", message.msg_from),
+                self.header("To", message.msg_to),
+                self.header("Subject", message.subject),
+                self.date(),
+                self.header("Message-ID", make_msgid(domain=self.msgid_domain)),
+                b"MIME-Version: 1.0\r\n",
+                b"Content-Type: multipart/alternative; "
+                + f'boundary="{boundary}"\r\n'.encode(),
+                CRLF,
+                *(delimiter + CRLF + part for part in parts),
+                delimiter + b"--" + CRLF,
+            ]
+        )
+
+        return PreparedMessage(
+            msg_from=message.msg_from,
+            recipients=message.recipients,
+            data=data,
+        )
@@ -1,6 +1,7 @@
-from typing import Self, Literal, Annotated, Protocol, override
+from typing import Self, Literal, Annotated, Protocol, TYPE_CHECKING, override
 
 import datetime
+import zlib
 
 from pathlib import Path
 from enum import StrEnum
@@ -13,6 +14,9 @@ from pydantic import ConfigDict
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+if TYPE_CHECKING:
+    from .leasestore import LeaseStore
+
 
 def maybeDateTime(v: str | datetime.datetime) -> datetime.datetime:
     if isinstance(v, str):
@@ -30,6 +34,11 @@ class LeaseStatus(StrEnum):
     ACTIVE = "active"
 
 
+class SkipReason(StrEnum):
+    NO_RECIPIENTS = "no recipients"
+    FILTERED = "filtered"
+
+
 class User(BaseModel):
     model_config = ConfigDict(frozen=True)
 
@@ -50,11 +59,37 @@ class Project(BaseModel):
 class Lease(BaseModel):
     id: str
     resource_name: str
+    resource_uuid: str | None = None
     project_id: str
     start_time: isoDateTime
     end_time: isoDateTime
     expire_time: isoDateTime | None = None
     status: LeaseStatus = LeaseStatus.ACTIVE
+    # the cloud the lease was fetched from, when there are several
+    cloud: str | None = None
+
+
+class LeaseLike(Protocol):
+    """Anything with the attributes of a Lease, such as a LeaseView."""
+
+    @property
+    def id(self) -> str: ...
+    @property
+    def resource_name(self) -> str: ...
+    @property
+    def resource_uuid(self) -> str | None: ...
+    @property
+    def project_id(self) -> str: ...
+    @property
+    def start_time(self) -> datetime.datetime: ...
+    @property
+    def end_time(self) -> datetime.datetime: ...
+    @property
+    def expire_time(self) -> datetime.datetime | None: ...
+    @property
+    def status(self) -> LeaseStatus: ...
+    @property
+    def cloud(self) -> str | None: ...
 
 
 class IdReference(BaseModel):
@@ -68,7 +103,13 @@ class Scope(BaseModel):
 class RoleAssignment(BaseModel):
     role: IdReference
     scope: Scope
-    user: IdReference
+    user: IdReference | None = None
+    group: IdReference | None = None
+
+
+class GroupMember(BaseModel):
+    group_id: str
+    user_id: str
 
 
 class EmailTLSOption(IntEnum):
@@ -77,6 +118,27 @@ class EmailTLSOption(IntEnum):
     EMAIL_TLS_STARTTLS = 2
 
 
+class RateLimitConfiguration(BaseModel):
+    messages_per_minute: float = Field(default=60, gt=0)
+    min_messages_per_minute: float = Field(default=1, gt=0)
+    burst: int = Field(default=1, ge=1)
+    max_retries: int = Field(default=5, ge=0)
+    # on a transient (4xx) reply the rate is multiplied by backoff; after
+    # each accepted message it grows by recovery messages per minute, up to
+    # messages_per_minute.
+    backoff: float = Field(default=0.5, gt=0, le=1)
+    recovery: float = Field(default=1, ge=0)
+
+    @model_validator(mode="after")
+    def validate_rates(self) -> Self:
+        if self.min_messages_per_minute > self.messages_per_minute:
+            raise ValueError(
+                "min_messages_per_minute must not exceed messages_per_minute"
+            )
+
+        return self
+
+
 class EmailConfiguration(BaseModel):
     smtp_server: str = "127.0.0.1"
     smtp_port: int = 25
@@ -84,6 +146,7 @@ class EmailConfiguration(BaseModel):
     smtp_username: str | None = None
     smtp_password: str | None = None
     smtp_from: str
+    rate_limit: RateLimitConfiguration | None = None
 
     @field_validator("smtp_server")
     @classmethod
@@ -112,6 +175,42 @@ class EmailConfiguration(BaseModel):
 
 class OpenstackConfiguration(BaseModel):
     cloud: str | None = None
+    # fetch from several clouds (or regions) at once, instead of `cloud`
+    clouds: list[str] = []
+    cloud_timeout: float | None = None
+    page_sizes: dict[
+        Literal["users", "projects", "role_assignments", "leases", "nodes"], int
+    ] = {}
+    pool_size: int | None = None
+    prefetch: bool = False
+    token_cache: Path | None = None
+    token_cache_margin: datetime.timedelta = datetime.timedelta(minutes=5)
+
+
+class ShardSpec(BaseModel):
+    index: int
+    count: int
+
+    @model_validator(mode="after")
+    def validate_index(self) -> Self:
+        if self.count < 1:
+            raise ValueError("shard count must be at least 1")
+        if not 0 <= self.index < self.count:
+            raise ValueError(f"shard index must be between 0 and {self.count - 1}")
+
+        return self
+
+    @classmethod
+    def parse(cls, spec: str) -> Self:
+        """Parse a shard specification of the form `<index>/<count>`."""
+        index, count = spec.split("/")
+        return cls(index=int(index), count=int(count))
+
+    def selects_project(self, project_id: str) -> bool:
+        return zlib.crc32(project_id.encode()) % self.count == self.index
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
 
 
 class ProjectResolver(Protocol):
@@ -119,9 +218,13 @@ class ProjectResolver(Protocol):
 
 
 class Filter(BaseModel):
-    def selects(self, lease: Lease) -> bool:  # pyright: ignore[reportUnusedParameter]
+    def selects(self, lease: LeaseLike) -> bool:  # pyright: ignore[reportUnusedParameter]
         return False
 
+    def select(self, store: "LeaseStore") -> list[int]:
+        """Return the indices of the leases in store selected by this filter."""
+        return [i for i, lease in enumerate(store) if self.selects(lease)]
+
     def resolve(self, resolver: ProjectResolver) -> None:  # pyright: ignore[reportUnusedParameter]
         pass
 
@@ -130,11 +233,17 @@ class ExpiresFilter(Filter):
     kind: Literal["expires"] = "expires"
     daysleft: int
 
+    @property
+    def deadline(self) -> datetime.datetime:
+        return datetime.datetime.now() + datetime.timedelta(days=self.daysleft)
+
+    @override
+    def selects(self, lease: LeaseLike) -> bool:
+        return lease.end_time <= self.deadline
+
     @override
-    def selects(self, lease: Lease) -> bool:
-        return lease.end_time <= datetime.datetime.now() + datetime.timedelta(
-            days=self.daysleft
-        )
+    def select(self, store: "LeaseStore") -> list[int]:
+        return store.ending_between(end=self.deadline)
 
 
 class ProjectFilter(Filter):
@@ -143,14 +252,25 @@ class ProjectFilter(Filter):
     _project: Project
 
     @override
-    def selects(self, lease: Lease) -> bool:
+    def selects(self, lease: LeaseLike) -> bool:
         return lease.project_id == self._project.id
 
+    @override
+    def select(self, store: "LeaseStore") -> list[int]:
+        return store.select_projects(lambda project_id: project_id == self._project.id)
+
     @override
     def resolve(self, resolver: ProjectResolver):
         self._project = resolver.resolve_project(self.project)
 
 
+class EnrichmentConfiguration(BaseModel):
+    # node attributes to add to each lease, such as "resource_class" or
+    # "properties.cpu_arch"
+    node_fields: list[str] = []
+    ttl: datetime.timedelta = datetime.timedelta(hours=1)
+
+
 class LeaseNotifierConfiguration(BaseModel):
     email: EmailConfiguration
     openstack: OpenstackConfiguration | None = None
@@ -158,6 +278,8 @@ class LeaseNotifierConfiguration(BaseModel):
     template_path: str | None = None
     idp: str | None = None
     mailer: str | None = None
+    shard: ShardSpec | None = None
+    enrichment: EnrichmentConfiguration | None = None
 
 
 class ConfigurationFile(BaseModel):
@@ -196,3 +318,39 @@ class Message(BaseModel):
     @property
     def msg_to(self) -> str:
         return ",".join(self.recipients)
+
+
+class PreparedMessage(BaseModel):
+    """A message that has already been serialized for sending."""
+
+    msg_from: str
+    recipients: list[str]
+    data: bytes
+
+
+class ReportEntry(BaseModel):
+    project_id: str
+    project_name: str
+    recipients: list[str] = []
+    lease_count: int = 0
+    subject_size: int = 0
+    body_text_size: int = 0
+    body_html_size: int = 0
+    skipped: SkipReason | None = None
+
+
+class ReportSummary(BaseModel):
+    projects: int = 0
+    messages: int = 0
+    leases: int = 0
+    recipients: int = 0
+    skipped: dict[SkipReason, int] = {}
+
+    def add(self, entry: ReportEntry) -> None:
+        self.projects += 1
+        if entry.skipped:
+            self.skipped[entry.skipped] = self.skipped.get(entry.skipped, 0) + 1
+        else:
+            self.messages += 1
+            self.leases += entry.lease_count
+            self.recipients += len(entry.recipients)
@@ -0,0 +1,191 @@
+import logging
+
+from collections.abc import Callable
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from functools import cache
+from typing import Any, TypeVar
+
+from .idp import OpenstackIdp
+from .leasestore import LeaseStore
+from .models import Lease
+from .models import Project
+from .models import RoleAssignment
+from .models import User
+
+LOG = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class MultiCloudIdp:
+    """Fetch from several clouds concurrently and merge the results.
+
+    Users and projects are merged by id, so clouds that share a Keystone
+    (such as several regions of one cloud) yield a single copy of each,
+    and a project's leases from every cloud end up in one message. Each
+    lease is tagged with the name of the cloud it came from.
+
+    A cloud that raises an error, or that does not answer within timeout
+    seconds, is logged and left out until it is next refreshed; the other
+    clouds are not affected. The threads of a cloud that timed out are not
+    interrupted, so set an api_timeout for it in clouds.yaml as well.
+    """
+
+    def __init__(self, idps: dict[str, OpenstackIdp], timeout: float | None = None):
+        self.idps = idps
+        self.timeout = timeout
+        self.failed: set[str] = set()
+
+    @classmethod
+    def from_clouds(
+        cls, clouds: list[str], timeout: float | None = None, **kwargs: Any
+    ) -> "MultiCloudIdp":
+        return cls(
+            {cloud: OpenstackIdp(cloud=cloud, **kwargs) for cloud in clouds},
+            timeout=timeout,
+        )
+
+    def gather(
+        self, func: Callable[[OpenstackIdp], T], names: Iterable[str] | None = None
+    ) -> dict[str, T]:
+        """Call func concurrently for each named cloud that has not failed.
+
+        If no names are given, func is called for every cloud.
+        """
+        clouds = {
+            name: self.idps[name]
+            for name in (self.idps if names is None else names)
+            if name not in self.failed
+        }
+        if not clouds:
+            return {}
+
+        executor = ThreadPoolExecutor(max_workers=len(clouds))
+        futures = {name: executor.submit(func, idp) for name, idp in clouds.items()}
+        wait(futures.values(), timeout=self.timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        results: dict[str, T] = {}
+        for name, future in futures.items():
+            if not future.done():
+                LOG.error("cloud %s timed out; ignoring it", name)
+                self.failed.add(name)
+            elif error := future.exception():
+                LOG.error("cloud %s failed; ignoring it: %s", name, error)
+                self.failed.add(name)
+            else:
+                results[name] = future.result()
+
+        # drop anything fetched before a cloud failed
+        return {
+            name: result for name, result in results.items() if name not in self.failed
+        }
+
+    def prefetch(self) -> None:
+        """Fetch everything from every cloud in a single concurrent round."""
+
+        def fetch(idp: OpenstackIdp) -> None:
+            idp.get_projects()
+            for group_id in {
+                ra.group.id for ra in idp.get_role_assignments() if ra.group
+            }:
+                idp.get_group_members(group_id)
+            idp.get_users()
+            idp.get_lease_store()
+
+        self.gather(fetch)
+
+    @cache
+    def get_users(self) -> list[User]:
+        users: dict[str, User] = {}
+        for cloud_users in self.gather(OpenstackIdp.get_users).values():
+            for user in cloud_users:
+                users.setdefault(user.id, user)
+
+        return list(users.values())
+
+    @cache
+    def get_projects(self) -> list[Project]:
+        projects: dict[str, Project] = {}
+        for cloud_projects in self.gather(OpenstackIdp.get_projects).values():
+            for project in cloud_projects:
+                projects.setdefault(project.id, project)
+
+        return list(projects.values())
+
+    @cache
+    def get_role_assignments(self) -> list[RoleAssignment]:
+        assignments: dict[tuple[str | None, ...], RoleAssignment] = {}
+        for cloud_assignments in self.gather(
+            OpenstackIdp.get_role_assignments
+        ).values():
+            for ra in cloud_assignments:
+                key = (
+                    ra.role.id,
+                    ra.scope.project.id if ra.scope.project else None,
+                    ra.user.id if ra.user else None,
+                    ra.group.id if ra.group else None,
+                )
+                assignments.setdefault(key, ra)
+
+        return list(assignments.values())
+
+    @cache
+    def get_group_clouds(self) -> dict[str, list[str]]:
+        """Map each group with a role assignment to the clouds it appears in."""
+        groups: dict[str, list[str]] = {}
+        for name, cloud_assignments in self.gather(
+            OpenstackIdp.get_role_assignments
+        ).items():
+            for group_id in {ra.group.id for ra in cloud_assignments if ra.group}:
+                groups.setdefault(group_id, []).append(name)
+
+        return groups
+
+    @cache
+    def get_group_members(self, group_id: str) -> list[str]:
+        members: dict[str, None] = {}
+        for cloud_members in self.gather(
+            lambda idp: idp.get_group_members(group_id),
+            self.get_group_clouds().get(group_id, []),
+        ).values():
+            members.update(dict.fromkeys(cloud_members))
+
+        return list(members)
+
+    def get_nodes(self, fields: list[str]) -> dict[str, dict[str, Any]]:
+        nodes: dict[str, dict[str, Any]] = {}
+        for cloud_nodes in self.gather(lambda idp: idp.get_nodes(fields)).values():
+            nodes.update(cloud_nodes)
+
+        return nodes
+
+    def get_leases(self) -> list[Lease]:
+        return [view.as_lease() for view in self.get_lease_store()]
+
+    @cache
+    def get_lease_store(self) -> LeaseStore:
+        store = LeaseStore()
+        for name, cloud_store in self.gather(OpenstackIdp.get_lease_store).items():
+            store.extend(cloud_store, cloud=name)
+
+        return store
+
+    def refresh_leases(self) -> None:
+        # give clouds that failed earlier another chance
+        self.failed.clear()
+        for idp in self.idps.values():
+            idp.refresh_leases()
+        self.get_lease_store.cache_clear()
+
+    def refresh_identity(self) -> None:
+        self.failed.clear()
+        for idp in self.idps.values():
+            idp.refresh_identity()
+        self.get_users.cache_clear()
+        self.get_projects.cache_clear()
+        self.get_role_assignments.cache_clear()
+        self.get_group_clouds.cache_clear()
+        self.get_group_members.cache_clear()
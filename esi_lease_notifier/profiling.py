@@ -0,0 +1,127 @@
+import cProfile
+import logging
+import sys
+import threading
+import tracemalloc
+
+from collections import Counter
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Protocol
+from types import FrameType
+
+LOG = logging.getLogger(__name__)
+TOP_ALLOCATIONS = 25
+
+
+class ProfilerProtocol(Protocol):
+    def phase(self, name: str) -> AbstractContextManager[None]: ...
+    def close(self) -> None: ...
+
+
+class NullProfiler:
+    """A profiler that does nothing."""
+
+    def __init__(self):
+        self._context = nullcontext()
+
+    def phase(self, name: str) -> AbstractContextManager[None]:  # pyright: ignore[reportUnusedParameter]
+        return self._context
+
+    def close(self) -> None:
+        pass
+
+
+class PhaseStats:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.first: tracemalloc.Snapshot | None = None
+        self.calls = 0
+        self.peak = 0
+
+
+class Profiler:
+    """Collect cProfile and tracemalloc data for each phase of a run.
+
+    A phase may be entered any number of times; its statistics accumulate.
+    When the profiler is closed it writes, for each phase, `<phase>.pstats`
+    (load it with the pstats module or a viewer such as snakeviz) and
+    `<phase>.alloc.txt`, which lists the peak traced memory and the
+    allocations retained between the first entry to the phase and the end
+    of the run. Heap snapshots are only taken on the first entry to each
+    phase and once more when the profiler is closed, so phases entered once
+    per message stay cheap.
+
+    If sample_interval is set, a background thread also samples the stack
+    of the profiled thread and writes `stacks.folded`, in the format read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, directory: str | Path, sample_interval: float | None = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.phases: dict[str, PhaseStats] = {}
+        self.current: str | None = None
+        self.stacks: Counter[str] = Counter()
+        self.thread_id = threading.get_ident()
+        self.sampler: threading.Thread | None = None
+        self.stopping = threading.Event()
+
+        tracemalloc.start()
+        if sample_interval:
+            self.sampler = threading.Thread(
+                target=self.sample, args=(sample_interval,), daemon=True
+            )
+            self.sampler.start()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        stats = self.phases.setdefault(name, PhaseStats())
+        stats.calls += 1
+        if stats.first is None:
+            stats.first = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.current = name
+        stats.profile.enable()
+        try:
+            yield
+        finally:
+            stats.profile.disable()
+            self.current = None
+            stats.peak = max(stats.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    def sample(self, interval: float) -> None:
+        while not self.stopping.wait(interval):
+            frame: FrameType | None = sys._current_frames().get(self.thread_id)
+            stack: list[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(self.current or "(no phase)")
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def close(self) -> None:
+        if self.sampler:
+            self.stopping.set()
+            self.sampler.join()
+            with (self.directory / "stacks.folded").open("w") as fd:
+                for stack, count in self.stacks.items():
+                    fd.write(f"{stack} {count}\n")
+
+        last = tracemalloc.take_snapshot() if self.phases else None
+        for name, stats in self.phases.items():
+            stats.profile.dump_stats(self.directory / f"{name}.pstats")
+            with (self.directory / f"{name}.alloc.txt").open("w") as fd:
+                fd.write(f"calls: {stats.calls}\n")
+                fd.write(f"peak traced memory: {stats.peak} bytes\n\n")
+                if stats.first and last:
+                    for diff in last.compare_to(stats.first, "lineno")[
+                        :TOP_ALLOCATIONS
+                    ]:
+                        fd.write(f"{diff}\n")
+
+        tracemalloc.stop()
+        LOG.info("wrote profile data to %s", self.directory)
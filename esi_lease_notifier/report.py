@@ -0,0 +1,82 @@
+import csv
+import json
+
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Protocol, TextIO, override
+
+from .models import ReportEntry
+
+
+class ReportProtocol(Protocol):
+    def add(self, entry: ReportEntry) -> None: ...
+    def close(self) -> None: ...
+
+
+class Report:
+    """Base class for reports that are written one entry at a time."""
+
+    fd: TextIO
+
+    def __init__(self, path: str | Path):
+        self.fd = open(path, "w", newline="")
+
+    def add(self, entry: ReportEntry) -> None:  # pyright: ignore[reportUnusedParameter]
+        pass
+
+    def close(self) -> None:
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+
+class JsonLinesReport(Report):
+    @override
+    def add(self, entry: ReportEntry) -> None:
+        self.fd.write(json.dumps(entry.model_dump(mode="json")) + "\n")
+        self.fd.flush()
+
+
+class CsvReport(Report):
+    def __init__(self, path: str | Path):
+        super().__init__(path)
+        self.writer = csv.DictWriter(self.fd, fieldnames=list(ReportEntry.model_fields))
+        self.writer.writeheader()
+
+    @override
+    def add(self, entry: ReportEntry) -> None:
+        row = entry.model_dump(mode="json")
+        row["recipients"] = ",".join(entry.recipients)
+        self.writer.writerow(row)
+        self.fd.flush()
+
+
+def open_report(path: str | Path) -> Report:
+    """Open a CSV report if path ends with .csv, otherwise a JSON Lines report."""
+    if Path(path).suffix.lower() == ".csv":
+        return CsvReport(path)
+
+    return JsonLinesReport(path)
+
+
+def read_report(path: str | Path) -> Iterator[ReportEntry]:
+    """Iterate over the entries in a report written by `open_report`."""
+    with open(path, newline="") as fd:
+        if Path(path).suffix.lower() == ".csv":
+            for row in csv.DictReader(fd):
+                yield ReportEntry.model_validate(
+                    {
+                        **row,
+                        "recipients": row["recipients"].split(",")
+                        if row["recipients"]
+                        else [],
+                        "skipped": row["skipped"] or None,
+                    }
+                )
+        else:
+            for line in fd:
+                yield ReportEntry.model_validate(json.loads(line))
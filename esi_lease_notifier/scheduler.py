@@ -0,0 +1,204 @@
+import datetime
+import heapq
+import itertools
+import logging
+import re
+import time
+
+from collections.abc import Callable
+
+from .app import NotifierApp
+from .models import LeaseLike
+
+LOG = logging.getLogger(__name__)
+
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_duration(spec: str) -> datetime.timedelta:
+    """Parse a duration such as `30m`, `24h` or `1d12h`."""
+    parts = re.findall(r"(\d+)([smhd])", spec)
+    if not parts or "".join(n + u for n, u in parts) != spec:
+        raise ValueError(f"invalid duration: {spec}")
+
+    return sum(
+        (datetime.timedelta(**{DURATION_UNITS[unit]: int(n)}) for n, unit in parts),
+        datetime.timedelta(),
+    )
+
+
+class ExpiryScheduler:
+    """Send expiry warnings when each lease reaches a warning threshold.
+
+    Every threshold (for example, 24 hours) produces a deadline of
+    `end_time - threshold` for each lease. Deadlines are kept in a heap, so
+    each tick only looks at the deadlines that are due. Leases are fetched
+    again every refresh_interval; only new leases, and leases whose end
+    time has changed, get new deadlines. Deadlines for leases that have
+    since been removed or changed are discarded when they come due. Users,
+    projects and role assignments change less often; they are fetched again
+    at the first lease refresh after identity_refresh_interval has passed.
+
+    A warning that cannot be sent is tried again after retry_interval, and
+    an error while refreshing is logged and retried in the same way. The
+    warnings that have been sent are remembered only for the lifetime of
+    the process.
+    """
+
+    def __init__(
+        self,
+        app: NotifierApp,
+        thresholds: list[datetime.timedelta],
+        refresh_interval: datetime.timedelta = datetime.timedelta(hours=1),
+        identity_refresh_interval: datetime.timedelta = datetime.timedelta(hours=24),
+        retry_interval: datetime.timedelta = datetime.timedelta(minutes=5),
+        clock: Callable[[], datetime.datetime] = datetime.datetime.now,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.app = app
+        self.thresholds = sorted(thresholds, reverse=True)
+        self.refresh_interval = refresh_interval
+        self.identity_refresh_interval = identity_refresh_interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.heap: list[tuple[datetime.datetime, int, str, datetime.datetime, int]] = []
+        self.counter = itertools.count()
+        self.leases: dict[str, LeaseLike] = {}
+        self.sent: set[tuple[str, datetime.datetime, int]] = set()
+        self.next_refresh: datetime.datetime | None = None
+        self.next_identity_refresh: datetime.datetime | None = None
+
+    def schedule(self, lease: LeaseLike, now: datetime.datetime) -> None:
+        # if several thresholds have already passed, only warn about the
+        # closest one.
+        past_due: int | None = None
+        for i, threshold in enumerate(self.thresholds):
+            due = lease.end_time - threshold
+            if due <= now:
+                past_due = i
+            else:
+                self.push(due, lease, i)
+
+        if past_due is not None and lease.end_time > now:
+            self.push(now, lease, past_due)
+
+    def push(self, due: datetime.datetime, lease: LeaseLike, threshold: int) -> None:
+        heapq.heappush(
+            self.heap, (due, next(self.counter), lease.id, lease.end_time, threshold)
+        )
+
+    def refresh(self, now: datetime.datetime) -> None:
+        if self.next_refresh is None:
+            self.app.fetch()
+            store = self.app.get_filtered_leases()
+            self.next_identity_refresh = now + self.identity_refresh_interval
+        else:
+            assert self.next_identity_refresh is not None
+            if now >= self.next_identity_refresh:
+                LOG.info("refreshing users, projects and role assignments")
+                self.app.refresh_identity()
+                self.next_identity_refresh = now + self.identity_refresh_interval
+
+            LOG.info("refreshing leases")
+            store = self.app.refresh_leases()
+
+        leases = {lease.id: lease for lease in store}
+        added = 0
+        for lease_id, lease in leases.items():
+            old = self.leases.get(lease_id)
+            if old is None or old.end_time != lease.end_time:
+                self.schedule(lease, now)
+                added += 1
+
+        self.leases = leases
+        self.sent = {key for key in self.sent if key[0] in leases}
+        self.next_refresh = now + self.refresh_interval
+        LOG.info(
+            "%d leases, %d new or changed, %d deadlines pending",
+            len(leases),
+            added,
+            len(self.heap),
+        )
+
+    def pop_due(self, now: datetime.datetime) -> dict[tuple[str, int], list[LeaseLike]]:
+        """Pop due deadlines and group the leases by project and threshold.
+
+        The deadlines are not marked as sent; see mark_sent.
+        """
+        due: dict[tuple[str, int], list[LeaseLike]] = {}
+        popped: set[tuple[str, datetime.datetime, int]] = set()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, lease_id, end_time, threshold = heapq.heappop(self.heap)
+            lease = self.leases.get(lease_id)
+            key = (lease_id, end_time, threshold)
+            if (
+                lease is None
+                or lease.end_time != end_time
+                or lease.end_time <= now
+                or key in self.sent
+                or key in popped
+            ):
+                continue
+
+            popped.add(key)
+            due.setdefault((lease.project_id, threshold), []).append(lease)
+
+        return due
+
+    def mark_sent(self, leases: list[LeaseLike], threshold: int) -> None:
+        self.sent.update((lease.id, lease.end_time, threshold) for lease in leases)
+
+    def tick(self) -> int:
+        """Refresh leases if needed and send any warnings that are due.
+
+        Returns the number of messages sent.
+        """
+        now = self.clock()
+        if self.next_refresh is None or now >= self.next_refresh:
+            self.refresh(now)
+
+        sent = 0
+        for (project_id, threshold), leases in self.pop_due(now).items():
+            project = self.app.projects_by_id.get(project_id)
+            if project is None:
+                LOG.warning("leases for unknown project %s", project_id)
+                continue
+            try:
+                if self.app.notify_project(
+                    project, leases, threshold=self.thresholds[threshold]
+                ):
+                    sent += 1
+            except Exception:
+                LOG.exception(
+                    "failed to warn project %s; retrying in %s",
+                    project.name,
+                    self.retry_interval,
+                )
+                for lease in leases:
+                    self.push(now + self.retry_interval, lease, threshold)
+                continue
+
+            self.mark_sent(leases, threshold)
+
+        return sent
+
+    def next_wakeup(self) -> datetime.datetime:
+        assert self.next_refresh is not None
+        if self.heap:
+            return min(self.heap[0][0], self.next_refresh)
+
+        return self.next_refresh
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.tick()
+                delay = (self.next_wakeup() - self.clock()).total_seconds()
+            except Exception:
+                LOG.exception("tick failed; retrying in %s", self.retry_interval)
+                delay = self.retry_interval.total_seconds()
+
+            if delay > 0:
+                LOG.debug("sleeping for %.0f seconds", delay)
+                self.sleep(delay)
@@ -0,0 +1,153 @@
+import gzip
+import json
+import logging
+import os
+
+from collections.abc import Iterable
+from collections.abc import Iterator
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from .idp import IdpProtocol
+from .idp import GroupResolvingIdp
+from .idp import LeaseStoreProvider
+from .models import User
+from .models import Project
+from .models import Lease
+from .models import RoleAssignment
+from .models import GroupMember
+
+LOG = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "esi-lease-notifier-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ENV = "ESI_LEASE_NOTIFIER_SNAPSHOT"
+DEFAULT_SNAPSHOT_FILE = "esi-lease-notifier-snapshot.jsonl.gz"
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def write_snapshot(idp: IdpProtocol, path: str | Path) -> int:
+    """Write the data returned by an idp to a gzip-compressed JSON Lines file.
+
+    The first line is a header identifying the format and version; every
+    following line is a single record of the form `{"kind": ..., "data": ...}`,
+    so a snapshot can be written and read one record at a time.
+
+    If the idp can list group members, the members of every group with a
+    role assignment are included. If it can load leases into a LeaseStore,
+    leases are read from the store (which NotifierApp also uses) and
+    converted to models one at a time.
+
+    Returns the number of records written.
+    """
+    role_assignments = list(idp.get_role_assignments())
+    group_members: list[BaseModel] = []
+    if isinstance(idp, GroupResolvingIdp):
+        for group_id in sorted({ra.group.id for ra in role_assignments if ra.group}):
+            group_members.extend(
+                GroupMember(group_id=group_id, user_id=user_id)
+                for user_id in idp.get_group_members(group_id)
+            )
+
+    leases: Iterable[BaseModel] = (
+        (view.as_lease() for view in idp.get_lease_store())
+        if isinstance(idp, LeaseStoreProvider)
+        else idp.get_leases()
+    )
+    sources: list[tuple[str, Iterable[BaseModel]]] = [
+        ("user", idp.get_users()),
+        ("project", idp.get_projects()),
+        ("role_assignment", role_assignments),
+        ("group_member", group_members),
+        ("lease", leases),
+    ]
+
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as fd:
+        fd.write(
+            json.dumps({"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION}) + "\n"
+        )
+        for kind, items in sources:
+            for item in items:
+                fd.write(
+                    json.dumps({"kind": kind, "data": item.model_dump(mode="json")})
+                    + "\n"
+                )
+                count += 1
+
+    LOG.info("wrote %d records to snapshot %s", count, path)
+    return count
+
+
+def read_snapshot(path: str | Path) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Iterate over the (kind, data) records in a snapshot file."""
+    with gzip.open(path, "rt", encoding="utf-8") as fd:
+        header = json.loads(fd.readline() or "{}")
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"{path}: not a snapshot file")
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(
+                f"{path}: unsupported snapshot version {header.get('version')}"
+            )
+
+        for line in fd:
+            record = json.loads(line)
+            yield record["kind"], record["data"]
+
+
+class SnapshotIdp:
+    """An idp that replays data captured with `write_snapshot`.
+
+    Each kind of record is read from the file (and validated) only the first
+    time it is requested. If no path is given, the path is taken from the
+    `ESI_LEASE_NOTIFIER_SNAPSHOT` environment variable so that the class can
+    be selected with the `idp:` configuration option.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(
+            path if path else os.environ.get(SNAPSHOT_ENV, DEFAULT_SNAPSHOT_FILE)
+        )
+
+    def _records(self, kind: str) -> Iterator[dict[str, Any]]:
+        LOG.info("reading %s records from snapshot %s", kind, self.path)
+        for thiskind, data in read_snapshot(self.path):
+            if thiskind == kind:
+                yield data
+
+    @cache
+    def get_users(self) -> list[User]:
+        return [User.model_validate(data) for data in self._records("user")]
+
+    @cache
+    def get_projects(self) -> list[Project]:
+        return [Project.model_validate(data) for data in self._records("project")]
+
+    @cache
+    def get_role_assignments(self) -> list[RoleAssignment]:
+        return [
+            RoleAssignment.model_validate(data)
+            for data in self._records("role_assignment")
+        ]
+
+    @cache
+    def get_group_memberships(self) -> dict[str, list[str]]:
+        members: dict[str, list[str]] = {}
+        for data in self._records("group_member"):
+            member = GroupMember.model_validate(data)
+            members.setdefault(member.group_id, []).append(member.user_id)
+
+        return members
+
+    def get_group_members(self, group_id: str) -> list[str]:
+        return self.get_group_memberships().get(group_id, [])
+
+    @cache
+    def get_leases(self) -> list[Lease]:
+        return [Lease.model_validate(data) for data in self._records("lease")]
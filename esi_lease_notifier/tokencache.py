@@ -0,0 +1,113 @@
+import datetime
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+
+from pathlib import Path
+from typing import Any
+
+from keystoneauth1 import access
+from keystoneauth1.identity.base import BaseIdentityPlugin
+
+LOG = logging.getLogger(__name__)
+DEFAULT_MARGIN = datetime.timedelta(minutes=5)
+
+
+class TokenCache:
+    """Keep Keystone tokens in a file so that later runs can reuse them.
+
+    The file holds the auth state of each authentication plugin that has
+    used it, keyed by the plugin's cache id (a hash of its credentials and
+    scope). It is written with mode 0600, and ignored if anyone but its
+    owner can read it. A cached token is only reused if it remains valid
+    for at least `margin`.
+
+    Keystone authentication itself is left to keystoneauth, which also
+    re-authenticates when a request is rejected with a 401; every new
+    token is saved to the cache.
+    """
+
+    def __init__(self, path: str | Path, margin: datetime.timedelta = DEFAULT_MARGIN):
+        self.path = Path(path).expanduser()
+        self.margin = margin
+        self.lock = threading.Lock()
+
+    def read(self) -> dict[str, Any]:
+        try:
+            with self.path.open() as fd:
+                mode = os.fstat(fd.fileno()).st_mode
+                if mode & (stat.S_IRWXG | stat.S_IRWXO):
+                    LOG.warning(
+                        "ignoring token cache %s: readable by other users", self.path
+                    )
+                    return {}
+                return json.load(fd)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            LOG.warning("ignoring token cache %s: %s", self.path, err)
+            return {}
+
+    def write(self, states: dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # mkstemp creates the file with mode 0600
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(states, fp)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def load(self, auth: BaseIdentityPlugin) -> bool:
+        """Install a cached token in auth; return True if one was found."""
+        cache_id = auth.get_cache_id()
+        state = self.read().get(cache_id) if cache_id else None
+        if state is None:
+            return False
+
+        try:
+            auth_ref = access.create(body=state["body"], auth_token=state["auth_token"])
+        except (KeyError, TypeError, ValueError) as err:
+            LOG.warning("ignoring cached token: %s", err)
+            return False
+
+        if auth_ref.will_expire_soon(int(self.margin.total_seconds())):
+            LOG.debug("cached token expires too soon")
+            return False
+
+        LOG.debug("using cached token, valid until %s", auth_ref.expires)
+        auth.auth_ref = auth_ref
+        return True
+
+    def save(self, auth: BaseIdentityPlugin) -> None:
+        cache_id = auth.get_cache_id()
+        state = auth.get_auth_state()
+        if not cache_id or not state:
+            return
+
+        with self.lock:
+            states = self.read()
+            states[cache_id] = json.loads(state)
+            self.write(states)
+        LOG.debug("saved token to %s", self.path)
+
+    def attach(self, auth: BaseIdentityPlugin) -> None:
+        """Load a cached token into auth, and save every new token it gets."""
+        self.load(auth)
+        get_auth_ref = auth.get_auth_ref
+
+        def get_auth_ref_and_save(*args: Any, **kwargs: Any) -> access.AccessInfo:
+            auth_ref = get_auth_ref(*args, **kwargs)
+            auth.auth_ref = auth_ref
+            try:
+                self.save(auth)
+            except OSError as err:
+                LOG.warning("unable to save token to %s: %s", self.path, err)
+            return auth_ref
+
+        auth.get_auth_ref = get_auth_ref_and_save  # pyright: ignore[reportAttributeAccessIssue]
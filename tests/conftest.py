@@ -1,12 +1,11 @@
 import pytest
-import subprocess
 import tempfile
-import time
-import random
-import smtplib
 
 from pathlib import Path
 
+from tests.fakecloud import FakeCloud
+from tests.smtpsink import SmtpSink
+
 
 @pytest.fixture
 def tempdir():
@@ -18,55 +17,15 @@ def tempdir():
 def smtp_sink_unix(tempdir: Path):
     socketpath = tempdir / "smtp.sock"
     dumppath = tempdir / "smtp.dump"
-    p = subprocess.Popen(
-        [
-            "smtp-sink",
-            "-S",
-            "---MESSAGE---\n",
-            "-D",
-            f"{dumppath}",
-            f"unix:{socketpath}",
-            "5",
-        ]
-    )
-
-    while not socketpath.is_socket():
-        time.sleep(0.1)
-    yield (dumppath, socketpath)
-    p.kill()
-    p.wait()
+    with SmtpSink(socketpath, dump_path=dumppath):
+        yield (dumppath, socketpath)
 
 
 @pytest.fixture
 def smtp_sink_tcp(tempdir: Path):
     dumppath = tempdir / "smtp.dump"
-    port = random.randint(10000, 30000)
-    p = subprocess.Popen(
-        [
-            "smtp-sink",
-            "-S",
-            "---MESSAGE---\n",
-            "-D",
-            f"{dumppath}",
-            f"localhost:{port}",
-            "5",
-        ]
-    )
-
-    # Wait until the server is listening
-    while True:
-        try:
-            with smtplib.SMTP("localhost", port=port):
-                pass
-        except ConnectionRefusedError:
-            time.sleep(0.1)
-            continue
-
-        break
-
-    yield (dumppath, port)
-    p.kill()
-    p.wait()
+    with SmtpSink(("localhost", 0), dump_path=dumppath) as sink:
+        yield (dumppath, sink.port)
 
 
 @pytest.fixture
@@ -84,3 +43,13 @@ def templates(tempdir: Path):
         fd.write("{{ leases|tabulate(html=True) }}")
 
     return tp
+
+
+@pytest.fixture
+def fakecloud(tempdir: Path, monkeypatch: pytest.MonkeyPatch):
+    with FakeCloud.generate(projects=5) as cloud:
+        monkeypatch.setenv(
+            "OS_CLIENT_CONFIG_FILE",
+            str(cloud.write_clouds_yaml(tempdir / "clouds.yaml")),
+        )
+        yield cloud
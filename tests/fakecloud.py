@@ -0,0 +1,402 @@
+"""A local stand-in for the Keystone and ESI lease APIs.
+
+FakeCloud serves users, projects, role assignments, group members and
+leases over HTTP, well enough for esi.connect() and OpenstackIdp to talk to
+it. Listings support limit/marker pagination, every request can be delayed
+by a fixed latency, and the requests made are counted per path.
+
+    with FakeCloud.generate(projects=100) as cloud:
+        os.environ["OS_CLIENT_CONFIG_FILE"] = str(cloud.write_clouds_yaml(path))
+        idp = OpenstackIdp(cloud="fake")
+"""
+
+import datetime
+import json
+import threading
+import time
+import uuid
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs
+from urllib.parse import urlencode
+from urllib.parse import urlparse
+
+import yaml
+
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+
+
+class FakeCloud:
+    def __init__(
+        self,
+        users: list[dict[str, Any]] | None = None,
+        projects: list[dict[str, Any]] | None = None,
+        role_assignments: list[dict[str, Any]] | None = None,
+        leases: list[dict[str, Any]] | None = None,
+        group_members: dict[str, list[str]] | None = None,
+        nodes: list[dict[str, Any]] | None = None,
+        latency: float = 0.0,
+        token_lifetime: datetime.timedelta = TOKEN_LIFETIME,
+    ):
+        self.users = users or []
+        self.projects = projects or []
+        self.role_assignments = role_assignments or []
+        self.leases = leases or []
+        self.group_members = group_members or {}
+        self.nodes = nodes or []
+        self.latency = latency
+        self.token_lifetime = token_lifetime
+        self.tokens: set[str] = set()
+        self.requests: Counter[str] = Counter()
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread: threading.Thread | None = None
+
+    @classmethod
+    def generate(
+        cls,
+        projects: int = 10,
+        users_per_project: int = 3,
+        leases_per_project: int = 5,
+        groups: int = 0,
+        users_per_group: int = 3,
+        **kwargs: Any,
+    ) -> "FakeCloud":
+        """Create a cloud with a synthetic set of projects, users and leases.
+
+        Each of the `groups` groups has `users_per_group` members of its
+        own, and a role in every project.
+        """
+        now = datetime.datetime.now().replace(microsecond=0)
+        data: dict[str, list[dict[str, Any]]] = {
+            "users": [],
+            "projects": [],
+            "role_assignments": [],
+            "leases": [],
+            "nodes": [],
+        }
+        group_members: dict[str, list[str]] = {}
+        for g in range(groups):
+            group_id = uuid.uuid4().hex
+            group_members[group_id] = []
+            for u in range(users_per_group):
+                user_id = uuid.uuid4().hex
+                group_members[group_id].append(user_id)
+                data["users"].append(
+                    {
+                        "id": user_id,
+                        "name": f"group{g}-{u}",
+                        "email": f"group{g}-{u}@example.com",
+                        "domain_id": "default",
+                        "enabled": True,
+                    }
+                )
+
+        for p in range(projects):
+            project_id = uuid.uuid4().hex
+            data["projects"].append(
+                {
+                    "id": project_id,
+                    "name": f"project{p}",
+                    "domain_id": "default",
+                    "is_domain": False,
+                    "enabled": True,
+                }
+            )
+            for u in range(users_per_project):
+                user_id = uuid.uuid4().hex
+                data["users"].append(
+                    {
+                        "id": user_id,
+                        "name": f"user{p}-{u}",
+                        "email": f"user{p}-{u}@example.com",
+                        "domain_id": "default",
+                        "enabled": True,
+                    }
+                )
+                data["role_assignments"].append(
+                    {
+                        "role": {"id": "member"},
+                        "scope": {"project": {"id": project_id}},
+                        "user": {"id": user_id},
+                    }
+                )
+            for group_id in group_members:
+                data["role_assignments"].append(
+                    {
+                        "role": {"id": "member"},
+                        "scope": {"project": {"id": project_id}},
+                        "group": {"id": group_id},
+                    }
+                )
+            for n in range(leases_per_project):
+                node_uuid = str(uuid.uuid4())
+                data["nodes"].append(
+                    {
+                        "uuid": node_uuid,
+                        "name": f"node{p}-{n}",
+                        "resource_class": f"class{n % 2}",
+                        "properties": {"cpu_arch": "x86_64", "memory_mb": 1024 * n},
+                    }
+                )
+                data["leases"].append(
+                    {
+                        "uuid": uuid.uuid4().hex,
+                        "resource": f"node{p}-{n}",
+                        "resource_uuid": node_uuid,
+                        "resource_type": "ironic_node",
+                        "project_id": project_id,
+                        "start_time": (now - datetime.timedelta(days=n)).isoformat(),
+                        "end_time": (now + datetime.timedelta(days=n + 1)).isoformat(),
+                        "status": "active",
+                    }
+                )
+
+        return cls(**data, group_members=group_members, **kwargs)  # pyright: ignore[reportArgumentType]
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeCloud":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeCloud":
+        return self.start()
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    def expire_tokens(self) -> None:
+        """Invalidate every token issued so far."""
+        with self.lock:
+            self.tokens.clear()
+
+    def cloud_config(self) -> dict[str, Any]:
+        return {
+            "auth_type": "password",
+            "auth": {
+                "auth_url": f"{self.url}/v3",
+                "username": "admin",
+                "password": "secret",
+                "project_name": "admin",
+                "user_domain_name": "Default",
+                "project_domain_name": "Default",
+            },
+            "region_name": "RegionOne",
+            "identity_api_version": 3,
+        }
+
+    def write_clouds_yaml(self, path: str | Path, name: str = "fake") -> Path:
+        """Write a clouds.yaml that points cloud `name` at this server."""
+        path = Path(path)
+        with path.open("w") as fd:
+            yaml.safe_dump({"clouds": {name: self.cloud_config()}}, fd)
+
+        return path
+
+    def catalog(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "type": service_type,
+                "name": name,
+                "id": name,
+                "endpoints": [
+                    {
+                        "id": f"{name}-{interface}",
+                        "interface": interface,
+                        "region": "RegionOne",
+                        "region_id": "RegionOne",
+                        "url": url,
+                    }
+                    for interface in ["public", "internal", "admin"]
+                ],
+            }
+            for service_type, name, url in [
+                ("identity", "keystone", f"{self.url}/v3"),
+                ("lease", "esi-leap", f"{self.url}/lease"),
+                ("baremetal", "ironic", f"{self.url}/baremetal"),
+            ]
+        ]
+
+    def issue_token(self) -> tuple[str, dict[str, Any]]:
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens.add(token)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        body = {
+            "token": {
+                "methods": ["password"],
+                "issued_at": now.isoformat(),
+                "expires_at": (now + self.token_lifetime).isoformat(),
+                "user": {
+                    "id": "admin",
+                    "name": "admin",
+                    "domain": {"id": "default", "name": "Default"},
+                },
+                "project": {
+                    "id": "admin",
+                    "name": "admin",
+                    "domain": {"id": "default", "name": "Default"},
+                },
+                "roles": [{"id": "admin", "name": "admin"}],
+                "catalog": self.catalog(),
+            }
+        }
+        return token, body
+
+    def listing(self, kind: str) -> list[dict[str, Any]]:
+        return getattr(self, kind)
+
+    def handler_class(self):
+        cloud = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with cloud.lock:
+                    cloud.connections += 1
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def send_json(
+                self,
+                status: int,
+                body: Any,
+                headers: dict[str, str] | None = None,
+            ) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def authorized(self) -> bool:
+                with cloud.lock:
+                    return self.headers.get("X-Auth-Token") in cloud.tokens
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with cloud.lock:
+                    cloud.requests[f"POST {url.path}"] += 1
+                time.sleep(cloud.latency)
+
+                if url.path == "/v3/auth/tokens":
+                    token, body = cloud.issue_token()
+                    self.send_json(201, body, {"X-Subject-Token": token})
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.rstrip("/")
+                with cloud.lock:
+                    cloud.requests[f"GET {path}"] += 1
+                time.sleep(cloud.latency)
+
+                if path == "/v3":
+                    self.send_json(
+                        200,
+                        {
+                            "version": {
+                                "id": "v3.14",
+                                "status": "stable",
+                                "links": [{"rel": "self", "href": f"{cloud.url}/v3/"}],
+                            }
+                        },
+                    )
+                    return
+
+                if path in ("/baremetal", "/baremetal/v1"):
+                    version = {
+                        "id": "v1",
+                        "status": "CURRENT",
+                        "min_version": "1.1",
+                        "version": "1.87",
+                        "links": [
+                            {"rel": "self", "href": f"{cloud.url}/baremetal/v1/"}
+                        ],
+                    }
+                    self.send_json(
+                        200, {"versions": [version], "default_version": version}
+                    )
+                    return
+
+                if not self.authorized():
+                    self.send_json(401, {"error": {"code": 401}})
+                    return
+
+                routes = {
+                    "/v3/users": ("users", "id"),
+                    "/v3/projects": ("projects", "id"),
+                    "/v3/role_assignments": ("role_assignments", None),
+                    "/lease/v1/leases": ("leases", "uuid"),
+                    "/baremetal/v1/nodes": ("nodes", "uuid"),
+                }
+                parts = path.split("/")
+                if path in routes:
+                    kind, key = routes[path]
+                    self.send_page(url.path, kind, key, parse_qs(url.query))
+                elif parts[:3] == ["", "v3", "groups"] and parts[4:] == ["users"]:
+                    members = set(cloud.group_members.get(parts[3], []))
+                    self.send_json(
+                        200,
+                        {
+                            "users": [u for u in cloud.users if u["id"] in members],
+                            "links": {"next": None},
+                        },
+                    )
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def send_page(
+                self,
+                path: str,
+                kind: str,
+                key: str | None,
+                query: dict[str, list[str]],
+            ) -> None:
+                items = cloud.listing(kind)
+                if key and "marker" in query:
+                    marker = query["marker"][0]
+                    index = next(
+                        (i for i, item in enumerate(items) if item[key] == marker),
+                        len(items) - 1,
+                    )
+                    items = items[index + 1 :]
+
+                next_link = None
+                if key and "limit" in query:
+                    limit = int(query["limit"][0])
+                    if len(items) > limit:
+                        marker = items[limit - 1][key]
+                        next_link = (
+                            f"{cloud.url}{path}?"
+                            f"{urlencode({'limit': limit, 'marker': marker})}"
+                        )
+                    items = items[:limit]
+
+                self.send_json(200, {kind: items, "links": {"next": next_link}})
+
+        return Handler
@@ -1,5 +1,6 @@
 import datetime
 
+from typing import Any
 from email.mime.multipart import MIMEMultipart
 
 from esi_lease_notifier.models import User
@@ -8,6 +9,7 @@ from esi_lease_notifier.models import Lease
 from esi_lease_notifier.models import RoleAssignment
 from esi_lease_notifier.models import IdReference
 from esi_lease_notifier.models import Scope
+from esi_lease_notifier.models import ReportEntry
 
 
 class FakeMailer:
@@ -20,6 +22,19 @@ class FakeMailer:
         self.record.append(msg)
 
 
+class FakeReport:
+    entries: list[ReportEntry]
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, entry: ReportEntry) -> None:
+        self.entries.append(entry)
+
+    def close(self) -> None:
+        pass
+
+
 class FakeIdp:
     def get_users(self) -> list[User]:
         return [
@@ -75,3 +90,49 @@ class FakeIdp:
                 user=IdReference(id="3"),
             ),
         ]
+
+
+class FakeGroupIdp(FakeIdp):
+    """A FakeIdp in which both projects also grant a role to a group."""
+
+    def __init__(self):
+        self.group_lookups = 0
+
+    def get_users(self) -> list[User]:
+        return super().get_users() + [
+            User(id="4", name="dave", email="dave@example.com"),
+        ]
+
+    def get_role_assignments(self) -> list[RoleAssignment]:
+        return super().get_role_assignments() + [
+            RoleAssignment(
+                role=IdReference(id="1"),
+                scope=Scope(project=IdReference(id=project_id)),
+                group=IdReference(id="g1"),
+            )
+            for project_id in ["1", "2"]
+        ]
+
+    def get_group_members(self, group_id: str) -> list[str]:
+        self.group_lookups += 1
+        return {"g1": ["2", "4"]}.get(group_id, [])
+
+
+class FakeNodeIdp(FakeIdp):
+    """A FakeIdp whose leases refer to nodes that it can list."""
+
+    def __init__(self):
+        self.node_lookups = 0
+
+    def get_leases(self) -> list[Lease]:
+        return [
+            lease.model_copy(update={"resource_uuid": f"node-{lease.id}"})
+            for lease in super().get_leases()
+        ]
+
+    def get_nodes(self, fields: list[str]) -> dict[str, dict[str, Any]]:
+        self.node_lookups += 1
+        return {
+            "node-1": {"resource_class": "fc430", "properties": {"cpu_arch": "x86_64"}},
+            "node-2": {"resource_class": "gpu", "properties": {"cpu_arch": "aarch64"}},
+        }
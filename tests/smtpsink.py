@@ -0,0 +1,202 @@
+"""A local SMTP/LMTP server that accepts and records messages.
+
+SmtpSink listens on TCP or on a unix socket (SmtpMailer speaks LMTP to
+socket paths; the sink accepts LHLO as well as HELO and EHLO). It stands
+in for Postfix's smtp-sink: messages can be dumped to a file, each
+preceded by a separator, and the file is only created once the first
+message arrives.
+
+Replies to the end of DATA can be delayed by a fixed latency, the number
+of recipients per message can be limited, and errors can be injected,
+either for the next few messages (`fail_next`) or at random (`error_rate`).
+
+    with SmtpSink(("127.0.0.1", 0)) as sink:
+        mailer = SmtpMailer(smtp_from=..., smtp_server="127.0.0.1",
+                            smtp_port=sink.port)
+"""
+
+import random
+import socketserver
+import threading
+import time
+
+from pathlib import Path
+
+DUMP_SEPARATOR = "---MESSAGE---\n"
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class UnixStreamServer(socketserver.ThreadingUnixStreamServer):
+    allow_reuse_address = True
+
+
+class SmtpSink:
+    def __init__(
+        self,
+        address: str | Path | tuple[str, int] = ("127.0.0.1", 0),
+        dump_path: str | Path | None = None,
+        latency: float = 0.0,
+        max_recipients: int | None = None,
+        error_rate: float = 0.0,
+        error_code: int = 451,
+        seed: int | None = None,
+    ):
+        self.unix = not isinstance(address, tuple)
+        self.dump_path = Path(dump_path) if dump_path else None
+        self.latency = latency
+        self.max_recipients = max_recipients
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.random = random.Random(seed)
+        self.failures: list[int] = []
+        self.messages: list[tuple[str, list[str], bytes]] = []
+        self.connections = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+        server_class = UnixStreamServer if self.unix else TCPServer
+        self.server = server_class(
+            str(address) if self.unix else address,  # pyright: ignore[reportArgumentType]
+            self.handler_class(),
+        )
+        self.server.daemon_threads = True
+        self.thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]  # pyright: ignore[reportIndexIssue]
+
+    @property
+    def path(self) -> str:
+        return self.server.server_address  # pyright: ignore[reportReturnType]
+
+    def start(self) -> "SmtpSink":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.unix:
+            Path(self.path).unlink(missing_ok=True)
+
+    def __enter__(self) -> "SmtpSink":
+        return self.start()
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    def fail_next(self, code: int, count: int = 1) -> None:
+        """Answer the end of DATA for the next `count` messages with `code`."""
+        with self.lock:
+            self.failures.extend([code] * count)
+
+    def data_reply(self) -> int:
+        with self.lock:
+            if self.failures:
+                return self.failures.pop(0)
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.error_code
+        return 250
+
+    def accept(self, sender: str, recipients: list[str], data: bytes) -> None:
+        with self.lock:
+            self.messages.append((sender, recipients, data))
+            if self.dump_path:
+                with self.dump_path.open("ab") as fd:
+                    fd.write(DUMP_SEPARATOR.encode())
+                    fd.write(data.replace(b"\r\n", b"\n"))
+
+    def handler_class(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                with sink.lock:
+                    sink.connections += 1
+
+            def reply(self, code: int, *lines: str) -> None:
+                # a multiline reply is sent with a single write; separate
+                # small writes would be held back by Nagle's algorithm
+                lines = lines or ("OK",)
+                self.wfile.write(
+                    "".join(
+                        f"{code}{' ' if i == len(lines) - 1 else '-'}{line}\r\n"
+                        for i, line in enumerate(lines)
+                    ).encode()
+                )
+
+            def handle(self):
+                self.reply(220, "sink ready")
+                sender: str | None = None
+                recipients: list[str] = []
+
+                while line := self.rfile.readline():
+                    command, _, arg = line.decode().rstrip("\r\n").partition(" ")
+                    command = command.upper()
+
+                    if command in ("EHLO", "LHLO"):
+                        self.reply(250, "sink", "8BITMIME")
+                    elif command == "HELO":
+                        self.reply(250, "sink")
+                    elif command == "MAIL":
+                        sender = address(arg)
+                        recipients = []
+                        self.reply(250)
+                    elif command == "RCPT":
+                        if sender is None:
+                            self.reply(503, "need MAIL first")
+                        elif (
+                            sink.max_recipients is not None
+                            and len(recipients) >= sink.max_recipients
+                        ):
+                            with sink.lock:
+                                sink.rejected += 1
+                            self.reply(452, "too many recipients")
+                        else:
+                            recipients.append(address(arg))
+                            self.reply(250)
+                    elif command == "DATA":
+                        if sender is None or not recipients:
+                            self.reply(503, "need RCPT first")
+                            continue
+                        self.reply(354, "send data")
+                        self.data(sender, recipients)
+                        sender, recipients = None, []
+                    elif command == "RSET":
+                        sender, recipients = None, []
+                        self.reply(250)
+                    elif command == "NOOP":
+                        self.reply(250)
+                    elif command == "QUIT":
+                        self.reply(221, "bye")
+                        break
+                    else:
+                        self.reply(502, "not implemented")
+
+            def data(self, sender: str, recipients: list[str]) -> None:
+                lines: list[bytes] = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b".\n", b""):
+                    lines.append(line[1:] if line.startswith(b".") else line)
+
+                time.sleep(sink.latency)
+                code = sink.data_reply()
+                if code == 250:
+                    sink.accept(sender, recipients, b"".join(lines))
+
+                # A real LMTP server answers once for each recipient, but
+                # smtplib.LMTP only reads a single reply, as for SMTP.
+                self.reply(code, "OK" if code == 250 else "rejected")
+
+        return Handler
+
+
+def address(arg: str) -> str:
+    """Extract the address from a `FROM:<...>` or `TO:<...>` argument."""
+    _, _, rest = arg.partition(":")
+    return rest.strip().split(" ")[0].strip("<>")
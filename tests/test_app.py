@@ -18,9 +18,13 @@ from esi_lease_notifier.models import IdReference
 from esi_lease_notifier.models import Scope
 from esi_lease_notifier.models import ProjectFilter
 from esi_lease_notifier.models import ExpiresFilter
+from esi_lease_notifier.models import SkipReason
+from esi_lease_notifier.models import ShardSpec
 
 from tests.fakes import FakeIdp
+from tests.fakes import FakeGroupIdp
 from tests.fakes import FakeMailer
+from tests.fakes import FakeReport
 
 
 @pytest.fixture
@@ -90,3 +94,82 @@ def test_expires_filter(app: NotifierApp, mailer: MailerProtocol):
 
     assert len(mailer.record) == 1
     assert mailer.record[0]["to"] == "bob@example.com"
+
+
+def test_report(
+    templates: str,
+    config: LeaseNotifierConfiguration,
+    idp: IdpProtocol,
+    mailer: MailerProtocol,
+):
+    report = FakeReport()
+    app = NotifierApp(
+        config, template_path=templates, idp=idp, mailer=mailer, report=report
+    )
+    app.config.filters.append(ExpiresFilter(daysleft=4))
+    app.process_leases()
+
+    assert len(report.entries) == 2
+    sent, filtered = report.entries
+    assert sent.project_name == "project2"
+    assert sent.recipients == ["bob@example.com"]
+    assert sent.lease_count == 1
+    assert sent.subject_size == len("Test email about project2")
+    assert sent.skipped is None
+    assert filtered.project_name == "project1"
+    assert filtered.skipped == SkipReason.FILTERED
+
+
+def test_shards(
+    templates: str,
+    config: LeaseNotifierConfiguration,
+    idp: IdpProtocol,
+):
+    recipients: list[str] = []
+    for index in range(3):
+        mailer = FakeMailer()
+        config.shard = ShardSpec(index=index, count=3)
+        app = NotifierApp(config, template_path=templates, idp=idp, mailer=mailer)
+        app.process_leases()
+        assert set(app.leases_by_project) == set(app.users_by_project)
+        recipients.extend(msg["to"] for msg in mailer.record)
+
+    assert len(recipients) == 2
+
+
+def test_shard_spec():
+    assert ShardSpec.parse("1/4") == ShardSpec(index=1, count=4)
+    assert str(ShardSpec.parse("1/4")) == "1/4"
+
+    with pytest.raises(ValueError):
+        ShardSpec.parse("4/4")
+
+
+def test_group_recipients(templates: str, config: LeaseNotifierConfiguration):
+    idp = FakeGroupIdp()
+    app = NotifierApp(config, template_path=templates, idp=idp, mailer=FakeMailer())
+
+    assert sorted(app.get_project_emails("project1")) == [
+        "alice@example.com",
+        "bob@example.com",
+        "dave@example.com",
+    ]
+    assert sorted(app.get_project_emails("project2")) == [
+        "bob@example.com",
+        "dave@example.com",
+    ]
+    # membership is looked up once and shared by both projects
+    assert idp.group_lookups == 1
+
+
+def test_group_recipients_unsupported(
+    templates: str, config: LeaseNotifierConfiguration
+):
+    class NoGroupIdp(FakeGroupIdp):
+        get_group_members = None  # pyright: ignore[reportAssignmentType]
+
+    app = NotifierApp(
+        config, template_path=templates, idp=NoGroupIdp(), mailer=FakeMailer()
+    )
+
+    assert sorted(app.get_project_emails("project2")) == ["bob@example.com"]
@@ -1,4 +1,5 @@
 import pytest
+import json
 import yaml
 
 from click.testing import CliRunner
@@ -6,6 +7,7 @@ from pathlib import Path
 from email.parser import Parser
 
 from esi_lease_notifier.cli import main
+from esi_lease_notifier.cli import merge
 
 
 @pytest.fixture
@@ -93,3 +95,99 @@ def test_cli_dryrun(
     )
     assert res.exit_code == 0
     assert not dumppath.exists()
+
+
+def test_cli_dryrun_report(
+    configfile: str,
+    templates: str,
+    tempdir: Path,
+    runner: CliRunner,
+    smtp_sink_unix: tuple[Path, Path],
+):
+    dumppath, _ = smtp_sink_unix
+    reportpath = tempdir / "report.jsonl"
+    emldir = tempdir / "eml"
+    res = runner.invoke(
+        main,
+        [
+            "-t",
+            templates,
+            "-c",
+            configfile,
+            "-n",
+            "--report",
+            str(reportpath),
+            "--eml-dir",
+            str(emldir),
+        ],
+    )
+    assert res.exit_code == 0
+    assert not dumppath.exists()
+
+    with reportpath.open() as fd:
+        entries = [json.loads(line) for line in fd]
+
+    assert [entry["project_name"] for entry in entries] == ["project1", "project2"]
+    assert len(list(emldir.glob("*.eml"))) == 2
+
+
+def test_cli_eml_dir_requires_dryrun(
+    configfile: Path,
+    templates: str,
+    tempdir: Path,
+    runner: CliRunner,
+    smtp_sink_unix: tuple[Path, Path],
+):
+    dumppath, _ = smtp_sink_unix
+    emldir = tempdir / "eml"
+    res = runner.invoke(
+        main, ["-t", templates, "-c", str(configfile), "--eml-dir", str(emldir)]
+    )
+    assert res.exit_code == 2
+    assert "--eml-dir" in res.output
+    assert not dumppath.exists()
+    assert not emldir.exists()
+
+    config = yaml.safe_load(configfile.read_text())
+    config["esi_lease_notifier"]["mailer"] = "tests.fakes.FakeMailer"
+    configfile.write_text(yaml.safe_dump(config))
+    res = runner.invoke(
+        main,
+        ["-t", templates, "-c", str(configfile), "-n", "--eml-dir", str(emldir)],
+    )
+    assert res.exit_code == 2
+    assert "configured mailer" in res.output
+
+
+def test_cli_merge(tempdir: Path, runner: CliRunner):
+    shard0 = tempdir / "shard0.jsonl"
+    shard1 = tempdir / "shard1.csv"
+    merged = tempdir / "merged.jsonl"
+    with shard0.open("w") as fd:
+        fd.write(
+            json.dumps(
+                {
+                    "project_id": "1",
+                    "project_name": "project1",
+                    "recipients": ["alice@example.com", "bob@example.com"],
+                    "lease_count": 2,
+                }
+            )
+            + "\n"
+        )
+    with shard1.open("w") as fd:
+        fd.write("project_id,project_name,recipients,lease_count,skipped\n")
+        fd.write("2,project2,,1,no recipients\n")
+
+    res = runner.invoke(merge, ["-o", str(merged), str(shard0), str(shard1)])
+    assert res.exit_code == 0
+
+    summary = yaml.safe_load(res.output)
+    assert summary["projects"] == 2
+    assert summary["messages"] == 1
+    assert summary["leases"] == 2
+    assert summary["recipients"] == 2
+    assert summary["skipped"] == {"no recipients": 1}
+
+    with merged.open() as fd:
+        assert len(fd.readlines()) == 2
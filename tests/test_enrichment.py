@@ -0,0 +1,73 @@
+import datetime
+
+from esi_lease_notifier.app import NotifierApp
+from esi_lease_notifier.enrichment import NodeEnricher
+from esi_lease_notifier.enrichment import lookup
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import EnrichmentConfiguration
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+
+from tests.fakes import FakeMailer
+from tests.fakes import FakeNodeIdp
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lookup():
+    node = {"resource_class": "gpu", "properties": {"cpu_arch": "x86_64"}}
+
+    assert lookup(node, "resource_class") == "gpu"
+    assert lookup(node, "properties.cpu_arch") == "x86_64"
+    assert lookup(node, "properties.missing") is None
+    assert lookup(node, "resource_class.missing") is None
+
+
+def test_node_enricher():
+    idp = FakeNodeIdp()
+    clock = FakeClock()
+    enricher = NodeEnricher(
+        idp,
+        ["resource_class", "properties.cpu_arch"],
+        ttl=datetime.timedelta(minutes=10),
+        clock=clock,
+    )
+    leases = idp.get_leases()
+
+    assert enricher.headings == ["RESOURCE_CLASS", "CPU_ARCH"]
+    assert [enricher.columns(lease) for lease in leases] == [
+        ("fc430", "x86_64"),
+        ("gpu", "aarch64"),
+    ]
+    assert enricher.columns(leases[0].model_copy(update={"resource_uuid": None})) == (
+        "",
+        "",
+    )
+    # one listing serves every lease until the ttl expires
+    assert idp.node_lookups == 1
+    clock.now += 600
+    enricher.columns(leases[0])
+    assert idp.node_lookups == 2
+
+
+def test_app_enrichment(templates: str):
+    mailer = FakeMailer()
+    app = NotifierApp(
+        LeaseNotifierConfiguration(
+            email=EmailConfiguration(smtp_from="test@example.com"),
+            enrichment=EnrichmentConfiguration(node_fields=["resource_class"]),
+        ),
+        template_path=templates,
+        idp=FakeNodeIdp(),
+        mailer=mailer,
+    )
+    app.process_leases()
+
+    bodies = [msg.get_payload()[0].get_payload() for msg in mailer.record]
+    assert "fc430" in bodies[0]
+    assert "gpu" in bodies[1]
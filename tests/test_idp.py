@@ -0,0 +1,146 @@
+import datetime
+import pytest
+import stat
+
+from pathlib import Path
+
+from esi_lease_notifier.app import NotifierApp
+from esi_lease_notifier.idp import OpenstackIdp
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+from esi_lease_notifier.models import OpenstackConfiguration
+from esi_lease_notifier.models import ShardSpec
+from esi_lease_notifier.tokencache import TokenCache
+
+from tests.fakecloud import FakeCloud
+from tests.fakes import FakeMailer
+
+
+def test_openstack_idp(fakecloud: FakeCloud):
+    idp = OpenstackIdp(cloud="fake")
+
+    assert len(idp.get_users()) == 15
+    assert len(idp.get_projects()) == 5
+    assert len(idp.get_role_assignments()) == 15
+    assert [lease.id for lease in idp.get_leases()] == [
+        lease["uuid"] for lease in fakecloud.leases
+    ]
+    assert fakecloud.requests["GET /lease/v1/leases"] == 1
+
+
+def test_openstack_idp_page_size(fakecloud: FakeCloud):
+    idp = OpenstackIdp(cloud="fake", page_sizes={"leases": 10, "users": 4})
+
+    assert len(idp.get_leases()) == 25
+    assert len(idp.get_users()) == 15
+    # openstacksdk asks for one more (empty) page after the last one
+    assert fakecloud.requests["GET /lease/v1/leases"] == 4
+    assert fakecloud.requests["GET /v3/users"] == 5
+
+
+def test_openstack_idp_prefetch(fakecloud: FakeCloud):
+    idp = OpenstackIdp(cloud="fake", pool_size=4, parallel=True)
+    idp.prefetch()
+
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 1
+    for path in ["/v3/users", "/v3/projects", "/v3/role_assignments"]:
+        assert fakecloud.requests[f"GET {path}"] == 1
+
+    idp.get_users()
+    idp.get_lease_store()
+    assert fakecloud.requests["GET /v3/users"] == 1
+    assert fakecloud.requests["GET /lease/v1/leases"] == 1
+
+
+def test_app_openstack(fakecloud: FakeCloud, templates: str):
+    mailer = FakeMailer()
+    app = NotifierApp(
+        LeaseNotifierConfiguration(
+            email=EmailConfiguration(smtp_from="test@example.com"),
+            openstack=OpenstackConfiguration(cloud="fake", prefetch=True),
+        ),
+        template_path=templates,
+        mailer=mailer,
+    )
+    app.process_leases()
+
+    assert len(mailer.record) == 5
+    assert all(len(msg["to"].split(",")) == 3 for msg in mailer.record)
+
+
+def test_openstack_idp_token_cache(fakecloud: FakeCloud, tempdir: Path):
+    cache_path = tempdir / "tokens.json"
+
+    OpenstackIdp(cloud="fake", token_cache=TokenCache(cache_path)).get_projects()
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 1
+    assert stat.S_IMODE(cache_path.stat().st_mode) == 0o600
+
+    # a second run reuses the cached token
+    OpenstackIdp(cloud="fake", token_cache=TokenCache(cache_path)).get_projects()
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 1
+
+    # a revoked token is replaced, and the new token is cached
+    fakecloud.expire_tokens()
+    OpenstackIdp(cloud="fake", token_cache=TokenCache(cache_path)).get_projects()
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 2
+    OpenstackIdp(cloud="fake", token_cache=TokenCache(cache_path)).get_projects()
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 2
+
+
+def test_openstack_idp_token_cache_margin(fakecloud: FakeCloud, tempdir: Path):
+    cache_path = tempdir / "tokens.json"
+    fakecloud.token_lifetime = datetime.timedelta(minutes=4)
+
+    for _ in range(2):
+        OpenstackIdp(
+            cloud="fake",
+            token_cache=TokenCache(cache_path, margin=datetime.timedelta(minutes=5)),
+        ).get_projects()
+
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 2
+
+
+def test_openstack_idp_token_cache_permissions(fakecloud: FakeCloud, tempdir: Path):
+    cache_path = tempdir / "tokens.json"
+    OpenstackIdp(cloud="fake", token_cache=TokenCache(cache_path)).get_projects()
+    cache_path.chmod(0o644)
+    OpenstackIdp(cloud="fake", token_cache=TokenCache(cache_path)).get_projects()
+
+    assert fakecloud.requests["POST /v3/auth/tokens"] == 2
+    assert stat.S_IMODE(cache_path.stat().st_mode) == 0o600
+
+
+def test_openstack_idp_groups(tempdir: Path, monkeypatch: pytest.MonkeyPatch):
+    with FakeCloud.generate(projects=4, groups=1) as cloud:
+        monkeypatch.setenv(
+            "OS_CLIENT_CONFIG_FILE",
+            str(cloud.write_clouds_yaml(tempdir / "clouds.yaml")),
+        )
+        idp = OpenstackIdp(cloud="fake", shard=ShardSpec(index=0, count=1))
+        (group_id,) = cloud.group_members
+
+        assert idp.get_group_members(group_id) == cloud.group_members[group_id]
+        # in a shard, users that only have a role through a group are kept
+        assert len(idp.get_users()) == 15
+
+        app = NotifierApp(
+            LeaseNotifierConfiguration(
+                email=EmailConfiguration(smtp_from="test@example.com"),
+            ),
+            idp=idp,
+            mailer=FakeMailer(),
+        )
+        for project in idp.get_projects():
+            assert len(app.get_project_emails(project.id)) == 6
+
+        assert cloud.requests[f"GET /v3/groups/{group_id}/users"] == 1
+
+
+def test_openstack_idp_nodes(fakecloud: FakeCloud):
+    idp = OpenstackIdp(cloud="fake")
+    nodes = idp.get_nodes(["resource_class", "properties"])
+
+    assert len(nodes) == 25
+    for lease in idp.get_leases():
+        assert lease.resource_uuid in nodes
+    assert fakecloud.requests["GET /baremetal/v1/nodes"] == 1
@@ -0,0 +1,101 @@
+import datetime
+
+from esi_lease_notifier.leasestore import LeaseStore
+from esi_lease_notifier.models import ExpiresFilter
+from esi_lease_notifier.models import Lease
+from esi_lease_notifier.models import Project
+from esi_lease_notifier.models import ProjectFilter
+
+NOW = datetime.datetime(2025, 6, 1, 12, 0)
+
+
+def make_leases(tzinfo: datetime.tzinfo | None = None) -> list[Lease]:
+    return [
+        Lease(
+            id=str(i),
+            resource_name=f"node{i % 3}",
+            project_id=f"project{i % 2}",
+            start_time=(NOW - datetime.timedelta(days=i)).replace(tzinfo=tzinfo),
+            end_time=(NOW + datetime.timedelta(days=i)).replace(tzinfo=tzinfo),
+            expire_time=(NOW + datetime.timedelta(days=i, hours=1)).replace(
+                tzinfo=tzinfo
+            )
+            if i % 2
+            else None,
+        )
+        for i in range(6)
+    ]
+
+
+class Resolver:
+    def resolve_project(self, name_or_id: str) -> Project:
+        return Project(id=name_or_id, name=name_or_id)
+
+
+def test_roundtrip():
+    leases = make_leases()
+    store = LeaseStore.from_leases(leases)
+
+    assert len(store) == len(leases)
+    assert [view.as_lease() for view in store] == leases
+    assert store[-1].id == "5"
+    assert len(store.strings.values) == 5
+
+
+def test_roundtrip_aware():
+    tz = datetime.timezone(datetime.timedelta(hours=-4))
+    leases = make_leases(tz)
+    store = LeaseStore.from_leases(leases)
+
+    assert [view.as_lease() for view in store] == leases
+    assert store[0].end_time.utcoffset() == datetime.timedelta(hours=-4)
+
+
+def test_group_by_project():
+    store = LeaseStore.from_leases(make_leases())
+    groups = store.group_by_project()
+
+    assert list(groups) == ["project0", "project1"]
+    assert [view.id for view in groups["project1"]] == ["1", "3", "5"]
+    assert store.count_by_project() == {"project0": 3, "project1": 3}
+
+
+def test_take():
+    store = LeaseStore.from_leases(make_leases())
+    subset = store.take(store.ending_between(end=NOW + datetime.timedelta(days=2)))
+
+    assert [view.id for view in subset] == ["0", "1", "2"]
+    assert subset[2].resource_name == "node2"
+
+
+def test_extend():
+    tz = datetime.timezone(datetime.timedelta(hours=2))
+    store = LeaseStore.from_leases(make_leases())
+    other = LeaseStore.from_leases(
+        lease.model_copy(update={"id": f"tz{lease.id}"}) for lease in make_leases(tz)
+    )
+    store.extend(other, cloud="other")
+
+    assert len(store) == 12
+    assert [view.as_lease() for view in store][6:] == [
+        lease.model_copy(update={"id": f"tz{lease.id}", "cloud": "other"})
+        for lease in make_leases(tz)
+    ]
+    assert store[0].cloud is None
+    assert len(store.strings.values) == 5
+
+
+def test_filters():
+    now = datetime.datetime.now()
+    store = LeaseStore.from_leases(
+        lease.model_copy(update={"end_time": now + datetime.timedelta(days=i, hours=1)})
+        for i, lease in enumerate(make_leases())
+    )
+
+    expires = ExpiresFilter(daysleft=2)
+    assert expires.select(store) == [0, 1]
+    assert [view.id for view in store if expires.selects(view)] == ["0", "1"]
+
+    project = ProjectFilter(project="project0")  # pyright: ignore[reportCallIssue]
+    project.resolve(Resolver())
+    assert project.select(store) == [0, 2, 4]
@@ -0,0 +1,86 @@
+import email
+import email.policy
+
+from email.utils import parseaddr
+
+from esi_lease_notifier.mime import MessageBuilder
+from esi_lease_notifier.models import Message
+
+
+def test_message_builder():
+    builder = MessageBuilder("test@example.com")
+    message = Message(
+        msg_from="test@example.com",
+        recipients=["alice@example.com", "bob@example.com"],
+        subject="Leases for prøject1",
+        body_html="<p>html body</p>",
+        body_text="text body",
+    )
+
+    prepared = builder.build(message)
+    assert prepared.msg_from == "test@example.com"
+    assert prepared.recipients == message.recipients
+    assert b"\r\n" in prepared.data
+
+    msg = email.message_from_bytes(prepared.data, policy=email.policy.default)
+    assert msg["subject"] == message.subject
+    assert msg["to"] == "alice@example.com, bob@example.com"
+    assert msg["message-id"].endswith("@example.com>")
+    assert msg["date"]
+    assert msg.get_content_type() == "multipart/alternative"
+    assert msg.get_body(("plain",)).get_content().strip() == "text body"  # pyright: ignore[reportOptionalMemberAccess]
+    assert msg.get_body(("html",)).get_content().strip() == "<p>html body</p>"  # pyright: ignore[reportOptionalMemberAccess]
+
+    assert builder.build(message).data != prepared.data
+
+
+def test_message_builder_encoded_body():
+    builder = MessageBuilder("test@example.com")
+    message = Message(
+        msg_from="test@example.com",
+        recipients=["alice@example.com"],
+        subject="x" * 200,
+        body_html="<p>" + "y" * 2000 + "</p>",
+        body_text="déjà vu\nsecond line",
+    )
+
+    msg = email.message_from_bytes(
+        builder.build(message).data, policy=email.policy.default
+    )
+    assert msg["subject"] == message.subject
+    assert msg.get_body(("plain",)).get_content() == message.body_text  # pyright: ignore[reportOptionalMemberAccess]
+    assert msg.get_body(("html",)).get_content() == message.body_html  # pyright: ignore[reportOptionalMemberAccess]
+
+
+def test_message_builder_display_name():
+    builder = MessageBuilder("ESI <esi@example.com>")
+    message = Message(
+        msg_from="ESI <esi@example.com>",
+        recipients=["alice@example.com"],
+        subject="test message",
+        body_html="<p>html body</p>",
+        body_text="text body",
+    )
+
+    # compat32 returns the Message-ID as sent, without repairing it
+    msg = email.message_from_bytes(builder.build(message).data)
+    _, msgid = parseaddr(msg["message-id"])
+    assert msgid.endswith("@example.com")
+    assert msg["message-id"] == f"<{msgid}>"
+
+
+def test_message_builder_long_encoded_subject():
+    builder = MessageBuilder("test@example.com")
+    message = Message(
+        msg_from="test@example.com",
+        recipients=["alice@example.com"],
+        subject="Héllo wörld " * 8,
+        body_html="<p>html body</p>",
+        body_text="text body",
+    )
+
+    data = builder.build(message).data
+    subject = data[data.index(b"Subject:") : data.index(b"\r\nDate:")]
+    assert all(len(line) <= 78 for line in subject.split(b"\r\n"))
+    msg = email.message_from_bytes(data, policy=email.policy.default)
+    assert msg["subject"] == message.subject
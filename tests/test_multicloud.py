@@ -0,0 +1,139 @@
+import pytest
+import yaml
+
+from collections.abc import Iterator
+from pathlib import Path
+
+from esi_lease_notifier.app import NotifierApp
+from esi_lease_notifier.idp import OpenstackIdp
+from esi_lease_notifier.leasestore import LeaseStore
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+from esi_lease_notifier.models import OpenstackConfiguration
+from esi_lease_notifier.multicloud import MultiCloudIdp
+
+from tests.fakecloud import FakeCloud
+from tests.fakes import FakeMailer
+
+
+@pytest.fixture
+def regions(
+    tempdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[tuple[FakeCloud, FakeCloud]]:
+    """Two regions that share users, projects and a group but not leases."""
+    with FakeCloud.generate(projects=4, leases_per_project=2, groups=1) as one:
+        other = FakeCloud.generate(projects=4, leases_per_project=3)
+        other.users = one.users
+        other.projects = one.projects
+        other.role_assignments = one.role_assignments
+        other.group_members = one.group_members
+        for i, lease in enumerate(other.leases):
+            lease["project_id"] = one.projects[i % 4]["id"]
+
+        with other:
+            path = tempdir / "clouds.yaml"
+            with path.open("w") as fd:
+                yaml.safe_dump(
+                    {
+                        "clouds": {
+                            "one": one.cloud_config(),
+                            "other": other.cloud_config(),
+                        }
+                    },
+                    fd,
+                )
+            monkeypatch.setenv("OS_CLIENT_CONFIG_FILE", str(path))
+            yield one, other
+
+
+def test_multicloud_merge(regions: tuple[FakeCloud, FakeCloud]):
+    idp = MultiCloudIdp.from_clouds(["one", "other"])
+    idp.prefetch()
+
+    assert len(idp.get_projects()) == 4
+    assert len(idp.get_users()) == 15
+    assert len(idp.get_role_assignments()) == 16
+    leases = idp.get_leases()
+    assert sorted(lease.cloud for lease in leases) == ["one"] * 8 + ["other"] * 12
+    assert [view.cloud for view in idp.get_lease_store()] == [
+        lease.cloud for lease in leases
+    ]
+
+
+def test_multicloud_app(regions: tuple[FakeCloud, FakeCloud], templates: Path):
+    mailer = FakeMailer()
+    app = NotifierApp(
+        LeaseNotifierConfiguration(
+            email=EmailConfiguration(smtp_from="test@example.com"),
+            openstack=OpenstackConfiguration(clouds=["one", "other"]),
+        ),
+        template_path=templates,
+        mailer=mailer,
+    )
+    app.process_leases()
+
+    # one message per project, covering the leases in both regions
+    assert len(mailer.record) == 4
+    assert all(len(msg["to"].split(",")) == 6 for msg in mailer.record)
+    body = mailer.record[0].get_payload()[0].get_payload()
+    assert "one" in body and "other" in body
+
+
+def test_multicloud_failure(regions: tuple[FakeCloud, FakeCloud]):
+    _, other = regions
+    other.stop()
+    idp = MultiCloudIdp.from_clouds(["one", "other"])
+
+    assert len(idp.get_projects()) == 4
+    assert idp.failed == {"other"}
+    assert {lease.cloud for lease in idp.get_leases()} == {"one"}
+
+
+def test_multicloud_timeout(regions: tuple[FakeCloud, FakeCloud]):
+    _, other = regions
+    other.latency = 2.0
+    idp = MultiCloudIdp.from_clouds(["one", "other"], timeout=1.0)
+    idp.prefetch()
+
+    assert idp.failed == {"other"}
+    assert len(idp.get_leases()) == 8
+
+
+def test_multicloud_group_failure(regions: tuple[FakeCloud, FakeCloud]):
+    one, _ = regions
+    (group_id,) = one.group_members
+    idp = MultiCloudIdp.from_clouds(["one", "other"])
+
+    def get_group_members(group_id: str) -> list[str]:
+        raise ConnectionError("unreachable")
+
+    idp.idps["other"].get_group_members = get_group_members  # pyright: ignore[reportAttributeAccessIssue]
+
+    assert idp.get_group_members(group_id) == one.group_members[group_id]
+    assert idp.failed == {"other"}
+
+    del idp.idps["other"].get_group_members
+    idp.refresh_identity()
+    assert idp.failed == set()
+    assert len(idp.get_users()) == 15
+
+
+def test_multicloud_refresh_after_failure(
+    regions: tuple[FakeCloud, FakeCloud], monkeypatch: pytest.MonkeyPatch
+):
+    idp = MultiCloudIdp.from_clouds(["one", "other"])
+    get_lease_store = OpenstackIdp.get_lease_store
+
+    def failing_get_lease_store(self: OpenstackIdp) -> LeaseStore:
+        if self is idp.idps["other"]:
+            raise ConnectionError("unreachable")
+        return get_lease_store(self)
+
+    monkeypatch.setattr(OpenstackIdp, "get_lease_store", failing_get_lease_store)
+    assert len(idp.get_lease_store()) == 8
+    assert idp.failed == {"other"}
+
+    monkeypatch.setattr(OpenstackIdp, "get_lease_store", get_lease_store)
+    idp.refresh_leases()
+    assert idp.failed == set()
+    assert len(idp.get_lease_store()) == 20
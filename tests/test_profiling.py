@@ -0,0 +1,60 @@
+import pstats
+import pytest
+import tracemalloc
+
+from pathlib import Path
+
+from esi_lease_notifier.app import NotifierApp
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+from esi_lease_notifier.profiling import Profiler
+
+from tests.fakes import FakeIdp
+from tests.fakes import FakeMailer
+
+
+def test_profiler(tempdir: Path, templates: Path):
+    profiledir = tempdir / "profile"
+    profiler = Profiler(profiledir, sample_interval=0.001)
+    app = NotifierApp(
+        LeaseNotifierConfiguration(
+            email=EmailConfiguration(smtp_from="test@example.com")
+        ),
+        template_path=templates,
+        idp=FakeIdp(),
+        mailer=FakeMailer(),
+        profiler=profiler,
+    )
+    app.process_leases()
+    profiler.close()
+
+    for phase in ["fetch_projects", "fetch_leases", "group", "render", "send"]:
+        pstats.Stats(str(profiledir / f"{phase}.pstats"))
+        assert (profiledir / f"{phase}.alloc.txt").exists()
+
+    with (profiledir / "render.alloc.txt").open() as fd:
+        assert fd.readline() == "calls: 2\n"
+
+    assert (profiledir / "stacks.folded").exists()
+
+
+def test_profiler_snapshots(tempdir: Path, monkeypatch: pytest.MonkeyPatch):
+    take_snapshot = tracemalloc.take_snapshot
+    snapshots = 0
+
+    def counting_take_snapshot() -> tracemalloc.Snapshot:
+        nonlocal snapshots
+        snapshots += 1
+        return take_snapshot()
+
+    monkeypatch.setattr(tracemalloc, "take_snapshot", counting_take_snapshot)
+    profiler = Profiler(tempdir / "profile")
+    for _ in range(100):
+        with profiler.phase("send"):
+            pass
+    assert snapshots == 1
+
+    profiler.close()
+    assert snapshots == 2
+    with (tempdir / "profile" / "send.alloc.txt").open() as fd:
+        assert fd.readline() == "calls: 100\n"
@@ -0,0 +1,54 @@
+import csv
+import json
+
+from pathlib import Path
+
+from esi_lease_notifier.models import ReportEntry
+from esi_lease_notifier.models import SkipReason
+from esi_lease_notifier.report import CsvReport
+from esi_lease_notifier.report import JsonLinesReport
+from esi_lease_notifier.report import open_report
+
+ENTRIES = [
+    ReportEntry(
+        project_id="1",
+        project_name="project1",
+        recipients=["alice@example.com", "bob@example.com"],
+        lease_count=2,
+        subject_size=10,
+    ),
+    ReportEntry(
+        project_id="2",
+        project_name="project2",
+        lease_count=1,
+        skipped=SkipReason.NO_RECIPIENTS,
+    ),
+]
+
+
+def test_jsonlines_report(tempdir: Path):
+    path = tempdir / "report.jsonl"
+    with open_report(path) as report:
+        assert isinstance(report, JsonLinesReport)
+        for entry in ENTRIES:
+            report.add(entry)
+
+    with path.open() as fd:
+        entries = [ReportEntry.model_validate(json.loads(line)) for line in fd]
+
+    assert entries == ENTRIES
+
+
+def test_csv_report(tempdir: Path):
+    path = tempdir / "report.csv"
+    with open_report(path) as report:
+        assert isinstance(report, CsvReport)
+        for entry in ENTRIES:
+            report.add(entry)
+
+    with path.open() as fd:
+        rows = list(csv.DictReader(fd))
+
+    assert rows[0]["recipients"] == "alice@example.com,bob@example.com"
+    assert rows[0]["skipped"] == ""
+    assert rows[1]["skipped"] == "no recipients"
@@ -0,0 +1,265 @@
+import datetime
+import pytest
+import smtplib
+
+from pathlib import Path
+
+from esi_lease_notifier.app import NotifierApp
+from email.mime.multipart import MIMEMultipart
+
+from esi_lease_notifier.models import EmailConfiguration
+from esi_lease_notifier.models import IdReference
+from esi_lease_notifier.models import Lease
+from esi_lease_notifier.models import LeaseNotifierConfiguration
+from esi_lease_notifier.models import Project
+from esi_lease_notifier.models import RoleAssignment
+from esi_lease_notifier.models import Scope
+from esi_lease_notifier.models import User
+from esi_lease_notifier.scheduler import ExpiryScheduler
+from esi_lease_notifier.scheduler import parse_duration
+
+from tests.fakes import FakeIdp
+from tests.fakes import FakeMailer
+
+NOW = datetime.datetime(2025, 6, 1, 12, 0)
+
+
+class MutableIdp(FakeIdp):
+    def __init__(self):
+        self.users = super().get_users()
+        self.projects = super().get_projects()
+        self.role_assignments = super().get_role_assignments()
+        self.leases = [
+            Lease(
+                id="1",
+                resource_name="node1",
+                project_id="1",
+                start_time=NOW,
+                end_time=NOW + datetime.timedelta(hours=30),
+            ),
+            Lease(
+                id="2",
+                resource_name="node2",
+                project_id="2",
+                start_time=NOW,
+                end_time=NOW + datetime.timedelta(hours=2),
+            ),
+        ]
+
+    def get_users(self) -> list[User]:
+        return self.users
+
+    def get_projects(self) -> list[Project]:
+        return self.projects
+
+    def get_role_assignments(self) -> list[RoleAssignment]:
+        return self.role_assignments
+
+    def get_leases(self) -> list[Lease]:
+        return self.leases
+
+
+class FlakyMailer(FakeMailer):
+    def __init__(self, failures: int = 0):
+        super().__init__()
+        self.failures = failures
+
+    def send_message(self, msg: MIMEMultipart) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise smtplib.SMTPServerDisconnected("connection lost")
+        super().send_message(msg)
+
+
+class Stop(BaseException):
+    pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self) -> datetime.datetime:
+        return self.now
+
+    def advance(self, **kwargs: float):
+        self.now += datetime.timedelta(**kwargs)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def idp() -> MutableIdp:
+    return MutableIdp()
+
+
+@pytest.fixture
+def mailer() -> FakeMailer:
+    return FakeMailer()
+
+
+@pytest.fixture
+def scheduler(templates: Path, idp: MutableIdp, mailer: FakeMailer, clock: FakeClock):
+    app = NotifierApp(
+        LeaseNotifierConfiguration(
+            email=EmailConfiguration(smtp_from="test@example.com")
+        ),
+        template_path=templates,
+        idp=idp,
+        mailer=mailer,
+    )
+    return ExpiryScheduler(
+        app,
+        thresholds=[datetime.timedelta(hours=24), datetime.timedelta(hours=1)],
+        refresh_interval=datetime.timedelta(hours=4),
+        clock=clock,
+    )
+
+
+def test_parse_duration():
+    assert parse_duration("24h") == datetime.timedelta(hours=24)
+    assert parse_duration("1d12h30m") == datetime.timedelta(hours=36, minutes=30)
+
+    with pytest.raises(ValueError):
+        parse_duration("24 hours")
+
+
+def test_scheduler(scheduler: ExpiryScheduler, mailer: FakeMailer, clock: FakeClock):
+    # lease 2 is already inside the 24h threshold, so it is warned at once
+    assert scheduler.tick() == 1
+    assert mailer.record[-1]["to"] == "bob@example.com"
+    assert scheduler.tick() == 0
+
+    # lease 2 reaches its 1h threshold
+    clock.now = scheduler.next_wakeup()
+    assert clock.now == NOW + datetime.timedelta(hours=1)
+    assert scheduler.tick() == 1
+
+    # lease 1 reaches its 24h threshold
+    clock.advance(hours=5)
+    assert scheduler.tick() == 1
+    assert len(mailer.record) == 3
+    assert scheduler.tick() == 0
+
+
+def test_scheduler_refresh(
+    scheduler: ExpiryScheduler, idp: MutableIdp, mailer: FakeMailer, clock: FakeClock
+):
+    scheduler.tick()
+    assert len(mailer.record) == 1
+
+    # lease 1 is extended and lease 2 is removed before the next refresh
+    idp.leases = [
+        idp.leases[0].model_copy(
+            update={"end_time": NOW + datetime.timedelta(hours=50)}
+        )
+    ]
+    clock.advance(hours=4)
+    assert scheduler.tick() == 0
+    clock.advance(hours=2)
+    assert scheduler.tick() == 0
+
+    clock.now = NOW + datetime.timedelta(hours=26)
+    assert scheduler.tick() == 1
+    assert len(mailer.record) == 2
+
+
+def test_scheduler_refresh_identity(
+    scheduler: ExpiryScheduler, idp: MutableIdp, mailer: FakeMailer, clock: FakeClock
+):
+    scheduler.identity_refresh_interval = datetime.timedelta(hours=8)
+    assert scheduler.tick() == 1
+
+    # a project, with a member and a lease, is created after the first tick
+    idp.projects.append(Project(id="3", name="project3"))
+    idp.users.append(User(id="4", name="dave", email="dave@example.com"))
+    idp.role_assignments.append(
+        RoleAssignment(
+            role=IdReference(id="1"),
+            scope=Scope(project=IdReference(id="3")),
+            user=IdReference(id="4"),
+        )
+    )
+    idp.leases.append(
+        Lease(
+            id="3",
+            resource_name="node3",
+            project_id="3",
+            start_time=NOW,
+            end_time=NOW + datetime.timedelta(hours=20),
+        )
+    )
+
+    # leases are refreshed, but the project is not known yet
+    clock.advance(hours=4)
+    assert scheduler.tick() == 0
+
+    # users and projects are refreshed along with leases
+    clock.advance(hours=4)
+    assert scheduler.tick() == 1
+    assert set(mailer.record[-1]["to"].split(",")) == {
+        "alice@example.com",
+        "bob@example.com",
+    }
+
+    # lease 3 reaches its 1h threshold
+    clock.now = NOW + datetime.timedelta(hours=19)
+    assert scheduler.tick() == 1
+    assert mailer.record[-1]["to"] == "dave@example.com"
+
+
+def test_scheduler_send_failure(
+    scheduler: ExpiryScheduler, clock: FakeClock, caplog: pytest.LogCaptureFixture
+):
+    mailer = FlakyMailer(failures=1)
+    scheduler.app.mailer = mailer
+
+    # the warning is not marked as sent, and is tried again later
+    assert scheduler.tick() == 0
+    assert "failed to warn project project2" in caplog.text
+    assert scheduler.sent == set()
+    assert scheduler.next_wakeup() == NOW + scheduler.retry_interval
+
+    clock.now = scheduler.next_wakeup()
+    assert scheduler.tick() == 1
+    assert mailer.record[-1]["to"] == "bob@example.com"
+    assert scheduler.tick() == 0
+
+
+def test_scheduler_run_survives_errors(
+    scheduler: ExpiryScheduler,
+    idp: MutableIdp,
+    mailer: FakeMailer,
+    clock: FakeClock,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    get_leases = idp.get_leases
+    calls = 0
+
+    def failing_get_leases() -> list[Lease]:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("unreachable")
+        return get_leases()
+
+    monkeypatch.setattr(idp, "get_leases", failing_get_leases)
+
+    sleeps: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            raise Stop()
+        clock.advance(seconds=seconds)
+
+    scheduler.sleep = sleep
+    with pytest.raises(Stop):
+        scheduler.run()
+
+    # the first tick failed and was retried after retry_interval
+    assert sleeps[0] == scheduler.retry_interval.total_seconds()
+    assert len(mailer.record) == 1
@@ -1,10 +1,18 @@
+import pytest
 import random
+import smtplib
 import string
 
 from pathlib import Path
+from pydantic import ValidationError
 
 from esi_lease_notifier.models import Message
+from esi_lease_notifier.models import RateLimitConfiguration
+from esi_lease_notifier.mailer import RateShaper
 from esi_lease_notifier.mailer import SmtpMailer
+from esi_lease_notifier.mime import MessageBuilder
+
+from tests.smtpsink import SmtpSink
 
 
 def test_smtp_mailer_unix(smtp_sink_unix: tuple[Path, Path]):
@@ -51,3 +59,168 @@ def test_smtp_mailer_tcp(smtp_sink_tcp: tuple[Path, int]):
         assert f"To: {msg.msg_to}" in content
         assert msg.body_html in content
         assert msg.body_text in content
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, delay: float) -> None:
+        self.now += delay
+
+
+def test_rate_shaper():
+    clock = FakeClock()
+    shaper = RateShaper(
+        RateLimitConfiguration(messages_per_minute=60, burst=2),
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    for _ in range(4):
+        shaper.acquire()
+
+    # two messages from the burst, then one per second
+    assert clock.now == pytest.approx(2)
+    assert shaper.throttled == pytest.approx(2)
+
+    shaper.deferred()
+    assert shaper.rate == pytest.approx(0.5)
+    shaper.acquire()
+    assert clock.now == pytest.approx(4)
+
+    shaper.accepted()
+    assert shaper.rate == pytest.approx(0.5 + 1 / 60)
+
+
+def test_rate_limit_validation():
+    for invalid in [
+        {"messages_per_minute": 0},
+        {"min_messages_per_minute": 0},
+        {"messages_per_minute": 10, "min_messages_per_minute": 20},
+        {"burst": 0},
+        {"max_retries": -1},
+        {"backoff": 0},
+        {"backoff": 1.5},
+        {"recovery": -1},
+    ]:
+        with pytest.raises(ValidationError):
+            RateLimitConfiguration.model_validate(invalid)
+
+    RateLimitConfiguration(backoff=1, recovery=0, max_retries=0)
+
+
+def make_message() -> Message:
+    return Message(
+        msg_from="test@example.com",
+        recipients=["alice@example.com"],
+        subject="test message",
+        body_html="test html body",
+        body_text="test text body",
+    )
+
+
+def test_smtp_mailer_retries_transient(monkeypatch: pytest.MonkeyPatch):
+    replies = [451, 421, 250]
+    mailer = SmtpMailer(
+        smtp_from="test@example.com",
+        rate_limit=RateLimitConfiguration(messages_per_minute=6000),
+    )
+
+    def deliver(msg, recipients=None):  # pyright: ignore[reportUnusedParameter]
+        code = replies.pop(0)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, b"try again", "test@example.com")
+        return {}
+
+    monkeypatch.setattr(mailer, "deliver", deliver)
+    mailer.send_message(make_message().as_mime_multipart())
+
+    assert not replies
+    assert mailer.shaper is not None
+    assert mailer.shaper.deferrals == 2
+
+
+def test_smtp_mailer_permanent_failure(monkeypatch: pytest.MonkeyPatch):
+    mailer = SmtpMailer(
+        smtp_from="test@example.com",
+        rate_limit=RateLimitConfiguration(messages_per_minute=6000),
+    )
+
+    def deliver(msg, recipients=None):  # pyright: ignore[reportUnusedParameter]
+        raise smtplib.SMTPSenderRefused(550, b"no", "test@example.com")
+
+    monkeypatch.setattr(mailer, "deliver", deliver)
+    with pytest.raises(smtplib.SMTPSenderRefused):
+        mailer.send_message(make_message().as_mime_multipart())
+
+
+def test_smtp_mailer_prepared_unix(smtp_sink_unix: tuple[Path, Path]):
+    dumppath, socketpath = smtp_sink_unix
+    mailer = SmtpMailer(smtp_server=f"{socketpath}", smtp_from="test@example.com")
+
+    msg = make_message()
+    mailer.send_prepared(MessageBuilder("test@example.com").build(msg))
+
+    with dumppath.open() as fd:
+        content = fd.read()
+        assert "To: alice@example.com" in content
+        assert msg.body_html in content
+        assert msg.body_text in content
+
+
+def test_smtp_mailer_retries_sink():
+    with SmtpSink() as sink:
+        sink.fail_next(451, count=2)
+        mailer = SmtpMailer(
+            smtp_server="127.0.0.1",
+            smtp_port=sink.port,
+            smtp_from="test@example.com",
+            rate_limit=RateLimitConfiguration(messages_per_minute=6000),
+        )
+        mailer.send_message(make_message().as_mime_multipart())
+
+    assert len(sink.messages) == 1
+    assert sink.connections == 3
+    assert mailer.shaper is not None
+    assert mailer.shaper.deferrals == 2
+
+
+def test_smtp_mailer_recipient_limit(tempdir: Path):
+    with SmtpSink(tempdir / "smtp.sock", max_recipients=1) as sink:
+        mailer = SmtpMailer(
+            smtp_server=str(tempdir / "smtp.sock"),
+            smtp_from="test@example.com",
+            rate_limit=RateLimitConfiguration(messages_per_minute=6000),
+        )
+        msg = make_message()
+        msg.recipients = ["alice@example.com", "bob@example.com"]
+        mailer.send_prepared(MessageBuilder("test@example.com").build(msg))
+
+    # the recipient refused with a 452 is sent a copy of its own
+    assert [recipients for _, recipients, _ in sink.messages] == [
+        ["alice@example.com"],
+        ["bob@example.com"],
+    ]
+    assert sink.rejected == 1
+    assert mailer.shaper is not None
+    assert mailer.shaper.deferrals == 1
+
+
+def test_smtp_mailer_recipient_limit_unshaped(
+    tempdir: Path, caplog: pytest.LogCaptureFixture
+):
+    with SmtpSink(tempdir / "smtp.sock", max_recipients=1) as sink:
+        mailer = SmtpMailer(
+            smtp_server=str(tempdir / "smtp.sock"), smtp_from="test@example.com"
+        )
+        msg = make_message()
+        msg.recipients = ["alice@example.com", "bob@example.com"]
+        mailer.send_message(msg.as_mime_multipart())
+
+    ((_, recipients, _),) = sink.messages
+    assert recipients == ["alice@example.com"]
+    assert "relay refused mail to bob@example.com" in caplog.text
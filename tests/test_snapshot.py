@@ -0,0 +1,73 @@
+import gzip
+import json
+import pytest
+
+from pathlib import Path
+
+from esi_lease_notifier.leasestore import LeaseStore
+from esi_lease_notifier.models import Lease
+from esi_lease_notifier.snapshot import SnapshotError
+from esi_lease_notifier.snapshot import SnapshotIdp
+from esi_lease_notifier.snapshot import write_snapshot
+
+from tests.fakes import FakeIdp
+from tests.fakes import FakeGroupIdp
+
+
+def test_snapshot_roundtrip(tempdir: Path):
+    idp = FakeIdp()
+    path = tempdir / "snapshot.jsonl.gz"
+    count = write_snapshot(idp, path)
+    assert count == 11
+
+    snapshot = SnapshotIdp(path)
+    assert snapshot.get_users() == idp.get_users()
+    assert snapshot.get_projects() == idp.get_projects()
+    assert snapshot.get_role_assignments() == idp.get_role_assignments()
+    assert [lease.id for lease in snapshot.get_leases()] == ["1", "2"]
+
+
+class StoreIdp(FakeIdp):
+    def __init__(self):
+        self.store = LeaseStore.from_leases(super().get_leases())
+
+    def get_leases(self) -> list[Lease]:
+        raise AssertionError("leases should be read from the store")
+
+    def get_lease_store(self) -> LeaseStore:
+        return self.store
+
+
+def test_snapshot_lease_store(tempdir: Path):
+    idp = StoreIdp()
+    path = tempdir / "snapshot.jsonl.gz"
+    assert write_snapshot(idp, path) == 11
+
+    snapshot = SnapshotIdp(path)
+    assert snapshot.get_leases() == [view.as_lease() for view in idp.get_lease_store()]
+
+
+def test_snapshot_group_members(tempdir: Path):
+    path = tempdir / "snapshot.jsonl.gz"
+    write_snapshot(FakeGroupIdp(), path)
+
+    snapshot = SnapshotIdp(path)
+    assert snapshot.get_group_members("g1") == ["2", "4"]
+    assert snapshot.get_group_members("g2") == []
+
+
+def test_snapshot_from_environment(tempdir: Path, monkeypatch: pytest.MonkeyPatch):
+    path = tempdir / "snapshot.jsonl.gz"
+    write_snapshot(FakeIdp(), path)
+    monkeypatch.setenv("ESI_LEASE_NOTIFIER_SNAPSHOT", str(path))
+
+    assert len(SnapshotIdp().get_users()) == 3
+
+
+def test_snapshot_bad_version(tempdir: Path):
+    path = tempdir / "snapshot.jsonl.gz"
+    with gzip.open(path, "wt") as fd:
+        fd.write(json.dumps({"format": "esi-lease-notifier-snapshot", "version": 99}))
+
+    with pytest.raises(SnapshotError):
+        SnapshotIdp(path).get_users()